@@ -0,0 +1,153 @@
+import hashlib
+import json
+
+from psycopg2.extras import Json, execute_values
+
+from db_access import bulk_insert, transaction
+
+STAGES = ("generate", "validate", "publish")
+
+
+def request_hash(request_body):
+    # The same prompt and model parameters always map to the same record
+    canonical = json.dumps(request_body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ArticleStore:
+    """
+    Records each generation in article_generations, keyed by request hash,
+    with the raw completion, the parsed article (in articles) and the
+    status of every stage. A rerun reuses whatever already succeeded.
+    Submitted Batch API jobs are tracked in article_batches until collected.
+
+    Each call borrows its own pooled connection, so pipeline stages on
+    different threads never wait on each other's queries.
+    """
+
+    def _execute(self, name, query, params):
+        with transaction(name) as cur:
+            cur.execute(query, params)
+
+    def get(self, request_hash):
+        return self.get_many([request_hash]).get(request_hash)
+
+    def get_many(self, request_hashes):
+        # One round trip for the whole run instead of one per keyword
+        with transaction("get_generations") as cur:
+            cur.execute("""
+                SELECT g.request_hash, g.keyword, g.raw_completion, g.generate_status, g.validate_status,
+                       g.publish_status, g.published_link, a.title, a.content, a.metadata
+                FROM article_generations g
+                LEFT JOIN articles a ON a.id = g.article_id
+                WHERE g.request_hash = ANY(%s)
+            """, (list(request_hashes),))
+            rows = cur.fetchall()
+
+        records = {}
+        for row in rows:
+            record = {
+                "keyword": row[1],
+                "raw_completion": row[2],
+                "generate_status": row[3],
+                "validate_status": row[4],
+                "publish_status": row[5],
+                "published_link": row[6],
+                "article": None,
+            }
+            if row[7] is not None:
+                record["article"] = dict(row[9] or {}, title=row[7], content=row[8])
+            records[row[0]] = record
+        return records
+
+    def save_completion(self, request_hash, keyword, model, raw_completion):
+        self.save_completions([(request_hash, keyword, model, raw_completion)])
+
+    def save_completions(self, completions):
+        # completions: (request_hash, keyword, model, raw_completion) tuples.
+        # A new completion invalidates anything derived from the previous one.
+        # One upsert can't touch the same hash twice, so the last completion wins.
+        rows = {completion[0]: tuple(completion) + ("done",) for completion in completions}
+        with transaction("save_completions") as cur:
+            bulk_insert(cur, "article_generations", (
+                "request_hash", "keyword", "model", "raw_completion", "generate_status"
+            ), list(rows.values()), on_conflict="""
+            ON CONFLICT (request_hash) DO UPDATE SET
+                raw_completion = EXCLUDED.raw_completion,
+                generate_status = 'done',
+                validate_status = 'pending',
+                publish_status = 'pending',
+                article_id = NULL,
+                published_link = NULL,
+                last_error = NULL,
+                updated_at = NOW()
+            """)
+
+    def save_article(self, request_hash, keyword, article_data):
+        self.save_articles([(request_hash, keyword, article_data)])
+
+    def save_articles(self, articles):
+        # articles: (request_hash, keyword, article_data) tuples, written in two statements
+        if not articles:
+            return
+        rows = []
+        for request_hash, keyword, article_data in articles:
+            metadata = {key: value for key, value in article_data.items() if key not in ("title", "content")}
+            metadata["request_hash"] = request_hash
+            rows.append((article_data["title"], article_data["content"], Json([keyword]), Json(metadata)))
+
+        with transaction("save_articles") as cur:
+            ids = bulk_insert(cur, "articles", ("title", "content", "keywords", "metadata"), rows,
+                              returning="RETURNING id")
+            execute_values(cur, """
+                UPDATE article_generations AS g
+                SET article_id = v.article_id::uuid, validate_status = 'done',
+                    last_error = NULL, updated_at = NOW()
+                FROM (VALUES %s) AS v (request_hash, article_id)
+                WHERE g.request_hash = v.request_hash
+            """, [(request_hash, row[0]) for (request_hash, _, _), row in zip(articles, ids)])
+
+    def mark_published(self, request_hash, link):
+        self._execute("mark_published", """
+            UPDATE article_generations
+            SET publish_status = 'done', published_link = %s, last_error = NULL, updated_at = NOW()
+            WHERE request_hash = %s
+        """, (link, request_hash))
+
+    def mark_failed(self, request_hash, stage, error):
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage '{stage}'")
+        # A completion that fails validation must not be reused on the next run
+        reset_generate = ", generate_status = 'rejected'" if stage == "validate" else ""
+        self._execute("mark_failed", f"""
+            UPDATE article_generations
+            SET {stage}_status = 'failed', last_error = %s, updated_at = NOW(){reset_generate}
+            WHERE request_hash = %s
+        """, (str(error)[:2000], request_hash))
+
+    def get_pending_batch(self):
+        # The oldest submitted batch that no run has collected yet
+        with transaction("get_pending_batch") as cur:
+            cur.execute("""
+                SELECT batch_id, keywords, submitted_at FROM article_batches
+                WHERE status = 'pending'
+                ORDER BY submitted_at
+                LIMIT 1
+            """)
+            row = cur.fetchone()
+        if row is None:
+            return None
+        return {"batch_id": row[0], "keywords": row[1], "submitted_at": row[2].isoformat()}
+
+    def save_batch(self, batch_id, keywords):
+        # keywords: custom_id -> keyword for every request in the batch
+        self._execute("save_batch", """
+            INSERT INTO article_batches (batch_id, keywords) VALUES (%s, %s)
+            ON CONFLICT (batch_id) DO NOTHING
+        """, (batch_id, Json(keywords)))
+
+    def finish_batch(self, batch_id, status):
+        self._execute("finish_batch", """
+            UPDATE article_batches SET status = %s, finished_at = NOW()
+            WHERE batch_id = %s
+        """, (status, batch_id))
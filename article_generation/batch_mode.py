@@ -0,0 +1,98 @@
+import json
+import os
+import time
+
+from run_metrics import record_token_usage, span
+
+# Terminal states reported by GET /v1/batches/{id}
+BATCH_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def write_batch_file(request_bodies, path):
+    # One chat-completion request per line, keyed by custom_id
+    with open(path, "w") as f:
+        for custom_id, body in request_bodies.items():
+            f.write(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body,
+            }) + "\n")
+    return path
+
+
+def submit_batch(session, base_url, api_key, path, timeout=(10, 120)):
+    with span("openai_batch_request", operation="submit"):
+        return _submit_batch(session, base_url, api_key, path, timeout)
+
+
+def _submit_batch(session, base_url, api_key, path, timeout):
+    headers = {"Authorization": f"Bearer {api_key}"}
+    with open(path, "rb") as f:
+        upload = session.post(
+            f"{base_url}/files", headers=headers,
+            data={"purpose": "batch"}, files={"file": (os.path.basename(path), f)},
+            timeout=timeout,
+        )
+    upload.raise_for_status()
+
+    response = session.post(
+        f"{base_url}/batches", headers=headers,
+        json={
+            "input_file_id": upload.json()["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h",
+        },
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def get_batch(session, base_url, api_key, batch_id, timeout=(10, 60)):
+    with span("openai_batch_request", operation="poll"):
+        response = session.get(
+            f"{base_url}/batches/{batch_id}",
+            headers={"Authorization": f"Bearer {api_key}"}, timeout=timeout,
+        )
+        response.raise_for_status()
+    return response.json()
+
+
+def wait_for_batch(session, base_url, api_key, batch_id, poll_seconds=60, max_wait_seconds=None):
+    start_time = time.time()
+    while True:
+        batch = get_batch(session, base_url, api_key, batch_id)
+        counts = batch.get("request_counts") or {}
+        print(f"Batch {batch_id}: {batch['status']} ({counts.get('completed', 0)}/{counts.get('total', '?')} done)")
+        if batch["status"] in BATCH_FINAL_STATUSES:
+            return batch
+        if max_wait_seconds is not None and time.time() - start_time + poll_seconds > max_wait_seconds:
+            return batch
+        time.sleep(poll_seconds)
+
+
+def download_batch_results(session, base_url, api_key, batch, timeout=(10, 300)):
+    # custom_id -> completion text, or None where that request failed
+    results = {}
+    headers = {"Authorization": f"Bearer {api_key}"}
+    for file_key in ("output_file_id", "error_file_id"):
+        file_id = batch.get(file_key)
+        if not file_id:
+            continue
+        with span("openai_batch_request", operation="download"):
+            response = session.get(f"{base_url}/files/{file_id}/content", headers=headers, timeout=timeout)
+            response.raise_for_status()
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            result = record.get("response") or {}
+            if record.get("error") or result.get("status_code") != 200:
+                print(f"Batch request {record['custom_id']} failed: {record.get('error') or result.get('body')}")
+                results[record["custom_id"]] = None
+                continue
+            record_token_usage(result["body"].get("usage"), model=result["body"].get("model"), mode="batch")
+            results[record["custom_id"]] = result["body"]["choices"][0]["message"]["content"]
+    return results
+
@@ -0,0 +1,186 @@
+"""
+Local stand-in for the parts of the OpenAI API the article pipeline uses:
+chat completions (plain and streamed), file upload/download and batches.
+
+    python fake_openai_server.py --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 ARTICLE_MODE=batch python generate_articles.py
+
+Batches report "in_progress" for the first poll_count polls, then
+"completed" with a canned article for every request in the input file.
+"""
+import argparse
+import email
+import email.policy
+import itertools
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_article(prompt):
+    match = re.search(r'keyword: "(.*?)"', prompt)
+    keyword = match.group(1) if match else "unknown"
+    slug = re.sub(r"[^a-z0-9]+", "-", keyword.lower()).strip("-")
+    return json.dumps({
+        "title": f"A Closer Look at {keyword}",
+        "meta_description": f"Everything worth knowing about {keyword}.",
+        "slug": slug,
+        "excerpt": f"Why {keyword} matters.",
+        "content": f'<h2>{keyword}</h2><p class="body">Stand-in article body for "{keyword}".</p>',
+    })
+
+
+def fake_completion(body):
+    content = fake_article(body["messages"][-1]["content"])
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": len(content) // 4, "total_tokens": 100 + len(content) // 4},
+    }
+
+
+class FakeOpenAIState:
+    def __init__(self, poll_count=1):
+        self.poll_count = poll_count
+        self.files = {}
+        self.batches = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def new_id(self, prefix):
+        with self.lock:
+            return f"{prefix}-{next(self.ids)}"
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path == "/v1/chat/completions":
+            return self._chat_completion(json.loads(body))
+        if self.path == "/v1/files":
+            return self._upload_file(body)
+        if self.path == "/v1/batches":
+            return self._create_batch(json.loads(body))
+        self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+    def do_GET(self):
+        match = re.fullmatch(r"/v1/batches/([\w-]+)", self.path)
+        if match:
+            return self._get_batch(match.group(1))
+        match = re.fullmatch(r"/v1/files/([\w-]+)/content", self.path)
+        if match and match.group(1) in self.state.files:
+            content = self.state.files[match.group(1)]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/jsonl")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+    def _chat_completion(self, body):
+        completion = fake_completion(body)
+        if not body.get("stream"):
+            return self._send_json(completion)
+
+        content = completion["choices"][0]["message"]["content"]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for start in range(0, len(content), 8):
+            chunk = {"choices": [{"index": 0, "delta": {"content": content[start:start + 8]}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        usage = {"choices": [], "usage": completion["usage"]}
+        self.wfile.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode())
+
+    def _upload_file(self, body):
+        message = email.message_from_bytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body,
+            policy=email.policy.default,
+        )
+        file_id = self.state.new_id("file")
+        for part in message.iter_parts():
+            if part.get_filename():
+                self.state.files[file_id] = part.get_payload(decode=True)
+        self._send_json({"id": file_id, "object": "file", "purpose": "batch"})
+
+    def _create_batch(self, body):
+        batch_id = self.state.new_id("batch")
+        self.state.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "status": "in_progress",
+            "input_file_id": body["input_file_id"],
+            "polls": 0,
+        }
+        self._send_json(self._public_batch(batch_id))
+
+    def _get_batch(self, batch_id):
+        batch = self.state.batches.get(batch_id)
+        if batch is None:
+            return self._send_json({"error": {"message": "No such batch"}}, status=404)
+        batch["polls"] += 1
+        if batch["status"] == "in_progress" and batch["polls"] > self.state.poll_count:
+            self._complete_batch(batch)
+        self._send_json(self._public_batch(batch_id))
+
+    def _complete_batch(self, batch):
+        lines = []
+        for line in self.state.files[batch["input_file_id"]].decode().splitlines():
+            request = json.loads(line)
+            lines.append(json.dumps({
+                "id": self.state.new_id("response"),
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "body": fake_completion(request["body"])},
+                "error": None,
+            }))
+        output_id = self.state.new_id("file")
+        self.state.files[output_id] = ("\n".join(lines) + "\n").encode()
+        batch["status"] = "completed"
+        batch["output_file_id"] = output_id
+        batch["request_counts"] = {"total": len(lines), "completed": len(lines), "failed": 0}
+
+    def _public_batch(self, batch_id):
+        return {key: value for key, value in self.state.batches[batch_id].items() if key != "polls"}
+
+
+def start_fake_server(host="127.0.0.1", port=0, poll_count=1):
+    # Returns the running server and the base URL to use as OPENAI_BASE_URL
+    handler = type("Handler", (FakeOpenAIHandler,), {"state": FakeOpenAIState(poll_count)})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in OpenAI API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--poll-count", type=int, default=1, help="Polls before a batch completes")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args.host, args.port, args.poll_count)
+    print(f"Fake OpenAI API listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
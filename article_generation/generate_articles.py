@@ -1,34 +1,70 @@
 import os
 from dotenv import load_dotenv
+import sys
 import requests
-import psycopg2
 from datetime import datetime
 import time
 import json
-import re
-import requests
+import tempfile
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_access import close_pool, get_pool, transaction
+from run_metrics import increment, observe, record_token_usage, set_gauge, span, write_run_report
+from article_store import ArticleStore, request_hash
+from batch_mode import (
+    BATCH_FINAL_STATUSES,
+    download_batch_results,
+    submit_batch,
+    wait_for_batch,
+    write_batch_file,
+)
+from json_repair import ArticleRepairError, load_article_json
+from json_stream import REQUIRED_ARTICLE_KEYS, IncrementalArticleValidator, OffFormatError
+from pipeline import Stage, run_pipeline
+
 # Load environment variables for secure access
 DATABASE_URL = os.getenv("DB_CONNECTION_STRING")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Overridable so tests can point at fake_openai_server.py
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 WORDPRESS_USERNAME = os.getenv("WORDPRESS_USERNAME")
 WORDPRESS_PASSWORD = os.getenv("WORDPRESS_PASSWORD")
 
+# Parallel article generations; capped so reserved tokens stay within the tier's TPM
+ARTICLE_CONCURRENCY = int(os.getenv("ARTICLE_CONCURRENCY", "3"))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "30000"))
+ARTICLE_MAX_TOKENS = 7000
+PROMPT_TOKEN_ESTIMATE = 1500
+PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", "2"))
+# Stream completions so off-format output is caught and aborted mid-generation
+OPENAI_STREAMING = os.getenv("OPENAI_STREAMING", "1") != "0"
+# Extra generations allowed when a completion can't be repaired locally
+MALFORMED_RETRIES = int(os.getenv("MALFORMED_RETRIES", "1"))
+# "interactive" calls chat completions directly; "batch" goes through the Batch API
+ARTICLE_MODE = os.getenv("ARTICLE_MODE", "interactive")
+BATCH_POLL_SECONDS = int(os.getenv("BATCH_POLL_SECONDS", "60"))
+# How long a run waits for a submitted batch before leaving it to a later run,
+# which finds it again in article_batches
+BATCH_MAX_WAIT_SECONDS = int(os.getenv("BATCH_MAX_WAIT_SECONDS", "0"))
+
+# (connect, read) timeouts; a 7000-token completion can take several minutes
+OPENAI_TIMEOUT = (10, 360)
+WORDPRESS_TIMEOUT = (10, 60)
+
 def fetch_recent_keywords():
     try:
-        conn = psycopg2.connect(DATABASE_URL)
-        cursor = conn.cursor()
-        query = """
-        SELECT text
-        FROM filtered_keywords
-        ORDER BY created_at DESC
-        LIMIT 10;
-        """
-        cursor.execute(query)
-        keywords = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return keywords
+        get_pool(DATABASE_URL)
+        with transaction("fetch_recent_keywords") as cursor:
+            query = """
+            SELECT text
+            FROM filtered_keywords
+            ORDER BY created_at DESC
+            LIMIT 10;
+            """
+            cursor.execute(query)
+            return [row[0] for row in cursor.fetchall()]
     except Exception as e:
         print(f"Error fetching keywords: {e}")
         return []
@@ -100,27 +136,35 @@ def build_openai_request(prompt, max_tokens):
     }
 
 
-def call_openai_api(data, headers, retries, delay, keyword):
+def call_openai_api(data, headers, retries, delay, keyword, session=None):
+    http = session or requests
     for attempt in range(1, retries + 1):
         try:
             print(
                 f"Attempt {attempt}: Generating article for keyword '{keyword}'...")
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions", headers=headers, json=data)
-            response.raise_for_status()
+            with span("openai_request", mode="plain"):
+                response = http.post(
+                    f"{OPENAI_BASE_URL}/chat/completions", headers=headers, json=data,
+                    timeout=OPENAI_TIMEOUT)
+                response.raise_for_status()
+            body = response.json()
+            record_token_usage(body.get("usage"), model=data["model"], mode="plain")
             print(f"Successfully generated article for keyword: '{keyword}'")
-            return response.json()["choices"][0]["message"]["content"]
+            return body["choices"][0]["message"]["content"]
         except requests.exceptions.HTTPError as http_err:
             code = http_err.response.status_code
             if code == 429:
-                print(f"Rate limit exceeded. Retrying in {delay} seconds...")
+                increment("openai_rate_limited_total")
+                increment("openai_retries_total", reason="rate_limited")
+                print(f"Rate limit exceeded for '{keyword}'. Retrying in {delay} seconds...")
                 time.sleep(delay)
                 delay *= 2
             elif code == 500:
-                print(f"Server error. Retrying in {delay} seconds...")
+                increment("openai_retries_total", reason="server_error")
+                print(f"Server error for '{keyword}'. Retrying in {delay} seconds...")
                 time.sleep(delay)
             else:
-                print(f"HTTP error: {http_err}")
+                print(f"HTTP error for '{keyword}': {http_err}")
                 print(f"Response: {http_err.response.content.decode()}")
                 break
         except Exception as e:
@@ -131,17 +175,107 @@ def call_openai_api(data, headers, retries, delay, keyword):
     return None
 
 
-def generate_article(keyword, max_tokens=7000, retries=3, delay=5):
-    prompt = build_prompt(keyword)
-    data = build_openai_request(prompt, max_tokens)
+def read_streamed_completion(response, keyword, model=None):
+    # Consume the SSE stream, validating the JSON shape as tokens arrive
+    validator = IncrementalArticleValidator()
+    parts = []
+    tokens = 0
+    usage_tokens = None
+    start_time = time.perf_counter()
+    first_token_at = None
+
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data: "):
+            continue
+        payload = line[len("data: "):]
+        if payload == "[DONE]":
+            break
+        chunk = json.loads(payload)
+        if chunk.get("usage"):
+            usage_tokens = chunk["usage"].get("completion_tokens")
+            record_token_usage(chunk["usage"], model=model or chunk.get("model"), mode="stream")
+        if not chunk.get("choices"):
+            continue
+        delta = chunk["choices"][0].get("delta", {}).get("content")
+        if not delta:
+            continue
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        tokens += 1
+        parts.append(delta)
+        validator.feed(delta)
+
+    validator.finish()
+
+    end_time = time.perf_counter()
+    tokens = usage_tokens or tokens
+    ttft = (first_token_at or end_time) - start_time
+    generation_seconds = end_time - (first_token_at or end_time)
+    tokens_per_second = tokens / generation_seconds if generation_seconds else 0.0
+    observe("openai_time_to_first_token_seconds", ttft)
+    print(f"[{keyword}] time to first token {ttft:.2f}s, {tokens} tokens at {tokens_per_second:.1f} tokens/sec")
+    return "".join(parts)
+
+
+def call_openai_api_streaming(data, headers, retries, delay, keyword, session=None):
+    http = session or requests
+    data = dict(data, stream=True, stream_options={"include_usage": True})
+    for attempt in range(1, retries + 1):
+        try:
+            print(
+                f"Attempt {attempt}: Streaming article for keyword '{keyword}'...")
+            with span("openai_request", mode="stream"), http.post(
+                f"{OPENAI_BASE_URL}/chat/completions", headers=headers, json=data,
+                timeout=OPENAI_TIMEOUT, stream=True
+            ) as response:
+                response.raise_for_status()
+                # Leaving the block early closes the connection, which stops the generation
+                content = read_streamed_completion(response, keyword, model=data["model"])
+            print(f"Successfully generated article for keyword: '{keyword}'")
+            return content
+        except OffFormatError as e:
+            increment("openai_off_format_total")
+            print(f"Aborted off-format output for '{keyword}': {e}")
+        except requests.exceptions.HTTPError as http_err:
+            code = http_err.response.status_code
+            if code == 429:
+                increment("openai_rate_limited_total")
+                increment("openai_retries_total", reason="rate_limited")
+                print(f"Rate limit exceeded for '{keyword}'. Retrying in {delay} seconds...")
+                time.sleep(delay)
+                delay *= 2
+            elif code == 500:
+                increment("openai_retries_total", reason="server_error")
+                print(f"Server error for '{keyword}'. Retrying in {delay} seconds...")
+                time.sleep(delay)
+            else:
+                print(f"HTTP error for '{keyword}': {http_err}")
+                print(f"Response: {http_err.response.content.decode()}")
+                break
+        except Exception as e:
+            print(f"Unexpected error generating article for '{keyword}': {e}")
+            break
+    print(
+        f"Failed to generate article for keyword: '{keyword}' after {retries} attempts.")
+    return None
+
+
+def build_article_request(keyword, max_tokens=ARTICLE_MAX_TOKENS):
+    return build_openai_request(build_prompt(keyword), max_tokens)
+
+
+def generate_article(keyword, max_tokens=ARTICLE_MAX_TOKENS, retries=3, delay=5, session=None, streaming=None, data=None):
+    data = data or build_article_request(keyword, max_tokens)
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json",
     }
-    return call_openai_api(data, headers, retries, delay, keyword)
+    if OPENAI_STREAMING if streaming is None else streaming:
+        return call_openai_api_streaming(data, headers, retries, delay, keyword, session=session)
+    return call_openai_api(data, headers, retries, delay, keyword, session=session)
 
 
-def publish_to_wordpress(title, content, excerpt=None, slug=None, status="draft"):
+def publish_to_wordpress(title, content, excerpt=None, slug=None, status="draft", session=None):
     url = "https://quantumquestor.com/wp-json/wp/v2/posts"
 
     data = {
@@ -155,14 +289,17 @@ def publish_to_wordpress(title, content, excerpt=None, slug=None, status="draft"
     if slug:
         data["slug"] = slug
 
+    http = session or requests
     try:
-        response = requests.post(
-            url,
-            json=data,
-            auth=HTTPBasicAuth(WORDPRESS_USERNAME, WORDPRESS_PASSWORD),
-            headers={"Content-Type": "application/json"}
-        )
-        response.raise_for_status()
+        with span("wordpress_publish"):
+            response = http.post(
+                url,
+                json=data,
+                auth=HTTPBasicAuth(WORDPRESS_USERNAME, WORDPRESS_PASSWORD),
+                headers={"Content-Type": "application/json"},
+                timeout=WORDPRESS_TIMEOUT
+            )
+            response.raise_for_status()
         return response.json()
     except Exception as e:
         print(f"Error publishing article '{title}': {e}")
@@ -171,43 +308,305 @@ def publish_to_wordpress(title, content, excerpt=None, slug=None, status="draft"
         return None
 
 
-def main():
-    # Fetch keywords
-    keywords = fetch_recent_keywords()
-    if not keywords:
-        print("No keywords retrieved. Exiting.")
-        return
+def resolve_concurrency(requested=None):
+    # Every in-flight request reserves prompt + max_tokens against the TPM limit
+    requested = requested or ARTICLE_CONCURRENCY
+    tier_cap = max(1, OPENAI_TOKENS_PER_MINUTE // (ARTICLE_MAX_TOKENS + PROMPT_TOKEN_ESTIMATE))
+    return max(1, min(requested, tier_cap))
+
+
+def build_session(pool_size):
+    # One keep-alive session per host, sized so every worker gets a pooled connection
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    return session
+
+
+def parse_article(keyword, article):
+    # Repair locally first; only an unrepairable completion is worth a new generation.
+    # Returns (article_data, None), or (None, reason) when the completion is unusable.
+    try:
+        article_data, repairs = load_article_json(article, REQUIRED_ARTICLE_KEYS)
+    except ArticleRepairError as e:
+        print(f"GPT returned unrepairable JSON for '{keyword}' ({e}).\n{article}")
+        return None, f"unrepairable article JSON: {e}"
+    if repairs:
+        print(f"[{keyword}] Repaired JSON locally: {', '.join(repairs)}")
+
+    missing = [key for key in REQUIRED_ARTICLE_KEYS if not isinstance(article_data.get(key), str)]
+    if missing:
+        print(f"GPT response for '{keyword}' is missing keys {missing}.")
+        return None, f"article JSON is missing keys {missing}"
+
+    print(f"[{keyword}] Title:", article_data["title"])
+    print(f"[{keyword}] Slug:", article_data["slug"])
+    print(f"[{keyword}] Preview:", article_data["meta_description"])
+    return article_data, None
+
+
+def prepare_item(keyword, store=None):
+    # Pick up whatever earlier runs already finished for this exact request
+    data = build_article_request(keyword)
+    item = {
+        "keyword": keyword,
+        "request": data,
+        "hash": request_hash(data),
+        "raw": None,
+        # (article_data, error) once the completion has been parsed
+        "parsed": None,
+        "article": None,
+        "link": None,
+    }
+    if store:
+        apply_stored_progress(item, store.get(item["hash"]))
+    return item
+
 
-    # Process each keyword
-    for keyword in keywords:
+def apply_stored_progress(item, record):
+    if record:
+        if record["generate_status"] == "done":
+            item["raw"] = record["raw_completion"]
+        if record["validate_status"] == "done" and record["article"]:
+            item["article"] = record["article"]
+        if record["publish_status"] == "done":
+            item["link"] = record["published_link"]
+
+
+def prepare_items(keywords, store):
+    # Look up every keyword's stored progress in a single query
+    items = [prepare_item(keyword) for keyword in keywords]
+    records = store.get_many([item["hash"] for item in items])
+    for item in items:
+        apply_stored_progress(item, records.get(item["hash"]))
+    return items
+
+
+def build_publish_stages(wordpress_session, store=None, publish_workers=PUBLISH_WORKERS):
+    def validate(item):
+        keyword = item["keyword"]
+        if item["article"]:
+            print(f"[{keyword}] Reusing stored article.")
+            return item
+        # Fresh completions were already parsed by generate; stored ones are parsed here
+        article_data, error = item["parsed"] or parse_article(keyword, item["raw"])
+        if not article_data:
+            print(f"Failed to generate article for keyword: {keyword}")
+            if store:
+                store.mark_failed(item["hash"], "validate", error)
+            return None
+        if store:
+            store.save_article(item["hash"], keyword, article_data)
+        item["article"] = article_data
+        return item
+
+    def publish(item):
+        keyword, article_data = item["keyword"], item["article"]
+        if item["link"]:
+            print(f"Already published article for '{keyword}': {item['link']}")
+            return keyword, item["link"]
+        response = publish_to_wordpress(
+            title=article_data["title"],
+            content=article_data["content"],
+            excerpt=article_data.get("excerpt"),
+            slug=article_data.get("slug"),
+            session=wordpress_session
+        )
+        if not response:
+            print(f"Failed to publish article for keyword: {keyword}")
+            if store:
+                store.mark_failed(item["hash"], "publish", "WordPress publish failed")
+            return None
+        print(f"Published article for '{keyword}': {response['link']}")
+        if store:
+            store.mark_published(item["hash"], response["link"])
+        return keyword, response["link"]
+
+    return [
+        Stage("validate", validate, workers=1),
+        Stage("publish", publish, workers=publish_workers),
+    ]
+
+
+def build_stages(openai_session, wordpress_session, generate_workers, store=None, publish_workers=PUBLISH_WORKERS):
+    def generate(item):
+        keyword = item["keyword"]
+        if item["raw"]:
+            print(f"[{keyword}] Reusing stored completion {item['hash'][:12]}.")
+            return item
         print(f"Processing keyword: {keyword}")
-        article = generate_article(keyword)
+        completion, parsed = None, None
+        for attempt in range(1 + MALFORMED_RETRIES):
+            article = generate_article(keyword, session=openai_session, data=item["request"])
+            if article is None:
+                break
+            completion, parsed = article, parse_article(keyword, article)
+            if parsed[0] is not None or attempt == MALFORMED_RETRIES:
+                break
+            print(f"Regenerating article for '{keyword}' (attempt {attempt + 2}) since repair was impossible.")
+        if completion is None:
+            print(f"Failed to generate article for keyword: {keyword}")
+            if store:
+                store.mark_failed(item["hash"], "generate", "no completion returned")
+            return None
+        # An unrepairable completion is stored too, then rejected by validate with its reason
+        if store:
+            store.save_completion(item["hash"], keyword, item["request"]["model"], completion)
+        item["raw"], item["parsed"] = completion, parsed
+        return item
 
-        article_data = None  # Always initialize
-        try:
-            if article.strip().startswith("```json"):
-                article = re.sub(r"^```json\s*|\s*```$", "", article.strip())
-
-            article_data = json.loads(article)
-            print("Title:", article_data["title"])
-            print("Slug:", article_data["slug"])
-            print("Preview:", article_data["meta_description"])
-        except json.JSONDecodeError:
-            print(f"GPT returned invalid JSON. You may want to retry or clean it up.\n{article}")
-
-        if article_data:
-            response = publish_to_wordpress(
-                title=article_data["title"],
-                content=article_data["content"],
-                excerpt=article_data.get("excerpt"),
-                slug=article_data.get("slug")
-            )
-            if response:
-                print(f"Published article: {response['link']}")
-            else:
-                print(f"Failed to publish article for keyword: {keyword}")
-        else:
+    return [Stage("generate", generate, workers=generate_workers)] + build_publish_stages(
+        wordpress_session, store, publish_workers
+    )
+
+
+def print_stage_report(stage_reports):
+    print("Stage throughput:")
+    for report in stage_reports:
+        set_gauge("pipeline_stage_utilization", report["utilization"], stage=report["stage"])
+        set_gauge("pipeline_stage_items_per_minute", report["items_per_minute"], stage=report["stage"])
+        print(
+            f"  {report['stage'].ljust(9)} workers={report['workers']} "
+            f"ok={report['processed']} failed={report['failed']} "
+            f"busy={report['busy_seconds']:.1f}s rate={report['items_per_minute']:.2f}/min "
+            f"utilization={report['utilization']:.0%}"
+        )
+
+
+def main(concurrency=None):
+    # fetch_recent_keywords opens the pool, so every path from here closes it
+    try:
+        keywords = fetch_recent_keywords()
+        if not keywords:
+            print("No keywords retrieved. Exiting.")
+            return
+
+        workers = resolve_concurrency(concurrency)
+        print(f"Generating {len(keywords)} articles with {workers} parallel workers...")
+
+        store = ArticleStore()
+        items = prepare_items(keywords, store)
+
+        # Generation, validation and publishing overlap: finished articles upload
+        # while others are still being written.
+        with build_session(workers) as openai_session, build_session(PUBLISH_WORKERS) as wordpress_session:
+            stages = build_stages(openai_session, wordpress_session, workers, store)
+            results, stage_reports = run_pipeline(items, stages)
+    finally:
+        close_pool()
+
+    published = dict(results)
+    print(f"Published {len(published)}/{len(keywords)} articles.")
+    print_stage_report(stage_reports)
+    return published
+
+
+def submit_article_batch(session, store, items):
+    request_bodies = {f"article-{index}": item["request"] for index, item in enumerate(items)}
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_batch_file(request_bodies, os.path.join(directory, "article_batch.jsonl"))
+        batch = submit_batch(session, OPENAI_BASE_URL, OPENAI_API_KEY, path)
+    state = {
+        "batch_id": batch["id"],
+        "keywords": {custom_id: item["keyword"] for custom_id, item in zip(request_bodies, items)},
+        "submitted_at": datetime.utcnow().isoformat(),
+    }
+    # Recorded before anything else can fail, so no later run resubmits these keywords
+    store.save_batch(state["batch_id"], state["keywords"])
+    print(f"Submitted batch {batch['id']} with {len(items)} articles.")
+    return state
+
+
+def collect_article_batch(session, store, state):
+    batch = wait_for_batch(
+        session, OPENAI_BASE_URL, OPENAI_API_KEY, state["batch_id"],
+        poll_seconds=BATCH_POLL_SECONDS, max_wait_seconds=BATCH_MAX_WAIT_SECONDS,
+    )
+    if batch["status"] not in BATCH_FINAL_STATUSES:
+        print(f"Batch {state['batch_id']} still {batch['status']}; a later run will collect it.")
+        return None
+    if batch["status"] != "completed":
+        print(f"Batch {state['batch_id']} ended as {batch['status']}; submitting fresh next run.")
+        store.finish_batch(state["batch_id"], batch["status"])
+        return []
+
+    completions = download_batch_results(session, OPENAI_BASE_URL, OPENAI_API_KEY, batch)
+    items = []
+    for custom_id, keyword in state["keywords"].items():
+        item = prepare_item(keyword)
+        if not completions.get(custom_id):
             print(f"Failed to generate article for keyword: {keyword}")
+            store.mark_failed(item["hash"], "generate", "batch request failed")
+            continue
+        item["raw"] = completions[custom_id]
+        items.append(item)
+
+    # The whole batch lands in one upsert, and every article that parses in one insert
+    store.save_completions([
+        (item["hash"], item["keyword"], item["request"]["model"], item["raw"]) for item in items
+    ])
+    # Only closed once its completions are stored, so a crash before this point collects it again
+    store.finish_batch(state["batch_id"], batch["status"])
+    valid = []
+    for item in items:
+        item["article"], error = parse_article(item["keyword"], item["raw"])
+        if item["article"]:
+            valid.append(item)
+        else:
+            print(f"Failed to generate article for keyword: {item['keyword']}")
+            store.mark_failed(item["hash"], "validate", error)
+    store.save_articles([(item["hash"], item["keyword"], item["article"]) for item in valid])
+    return valid
+
+
+def advance_batches(session, store):
+    """
+    One batch-mode step: collect the pending batch if there is one, then
+    submit this run's keywords unless that batch is still running. Returns
+    the items ready for the validate and publish stages.
+    """
+    ready = []
+    state = store.get_pending_batch()
+    if state is not None:
+        collected = collect_article_batch(session, store, state)
+        if collected is None:
+            return ready
+        ready.extend(collected)
+
+    keywords = fetch_recent_keywords()
+    if not keywords:
+        print("No keywords retrieved.")
+        return ready
+    # Articles just collected are already on their way to publishing
+    collected_hashes = {item["hash"] for item in ready}
+    items = [item for item in prepare_items(keywords, store) if item["hash"] not in collected_hashes]
+    # Stored completions skip the batch and go straight to publishing
+    ready.extend(item for item in items if item["raw"])
+    pending = [item for item in items if not item["raw"]]
+    if pending:
+        state = submit_article_batch(session, store, pending)
+        ready.extend(collect_article_batch(session, store, state) or [])
+    return ready
+
+
+def run_batch_mode():
+    # Completed results go through the same validate and publish stages
+    get_pool(DATABASE_URL)
+    try:
+        store = ArticleStore()
+        with build_session(PUBLISH_WORKERS) as openai_session, build_session(PUBLISH_WORKERS) as wordpress_session:
+            ready = advance_batches(openai_session, store)
+            if not ready:
+                return
+            results, stage_reports = run_pipeline(ready, build_publish_stages(wordpress_session, store))
+    finally:
+        close_pool()
+
+    published = dict(results)
+    print(f"Published {len(published)}/{len(ready)} batched articles.")
+    print_stage_report(stage_reports)
+    return published
+
 
 def load_env_from_dotenv():
     # Define the path to the secrets file
@@ -239,4 +638,10 @@ if __name__ == "__main__":
     # e.g., "your-site.wordpress.com"
     WORDPRESS_SITE_URL = os.getenv("WORDPRESS_SITE_URL")
 
-    main()
+    try:
+        if ARTICLE_MODE == "batch":
+            run_batch_mode()
+        else:
+            main()
+    finally:
+        write_run_report("article_generation", extra={"mode": ARTICLE_MODE})
@@ -0,0 +1,183 @@
+import json
+import re
+
+_KEY_AHEAD = re.compile(r'\s*"([^"\\\n]{1,64})"\s*:')
+_QUOTE_BRACE = re.compile(r'"\s*}')
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "'": "'"}
+
+
+class ArticleRepairError(ValueError):
+    pass
+
+
+def load_article_json(text, expected_keys=None):
+    """
+    Parse a model completion into a dict, repairing it locally if needed.
+
+    Returns (data, repairs) where repairs lists the fixes that were
+    applied (empty when the text was valid JSON). Raises
+    ArticleRepairError when the text can't be turned into an object.
+    expected_keys, when given, helps tell a real key apart from quoted
+    text inside the HTML content (e.g. an unescaped JSON-LD block).
+    """
+    stripped = _FENCE.sub("", text.strip())
+    try:
+        data = json.loads(stripped)
+        if isinstance(data, dict):
+            return data, []
+    except json.JSONDecodeError:
+        pass
+    return _ArticleRepairer(text, expected_keys).parse()
+
+
+class _ArticleRepairer:
+    # Tolerant parser for the flat {"key": "string", ...} objects we ask for
+
+    def __init__(self, text, expected_keys=None):
+        self.text = text
+        self.expected_keys = set(expected_keys) if expected_keys else None
+        self.pos = 0
+        self.repairs = []
+
+    def _note(self, repair):
+        if repair not in self.repairs:
+            self.repairs.append(repair)
+
+    def _skip_ws(self):
+        while self.pos < len(self.text) and self.text[self.pos].isspace():
+            self.pos += 1
+
+    def _peek(self):
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def parse(self):
+        start = self.text.find("{")
+        if start == -1:
+            raise ArticleRepairError("no JSON object found")
+        if _FENCE.sub("", self.text[:start]).strip():
+            self._note("stripped prose before the object")
+        self.pos = start + 1
+
+        data = {}
+        while True:
+            self._skip_ws()
+            char = self._peek()
+            if char == "":
+                if not data:
+                    raise ArticleRepairError("object is empty and truncated")
+                self._note("closed truncated object")
+                return data, self.repairs
+            if char == "}":
+                self.pos += 1
+                break
+            if char == ",":
+                # Stray or doubled comma
+                self.pos += 1
+                self._note("removed stray comma")
+                continue
+            if char != '"':
+                raise ArticleRepairError(f"expected a key at offset {self.pos}, got {char!r}")
+
+            self.pos += 1
+            key = self._read_key()
+            self._skip_ws()
+            if self._peek() != ":":
+                raise ArticleRepairError(f"expected ':' after key '{key}'")
+            self.pos += 1
+            self._skip_ws()
+            data[key] = self._read_value(key)
+
+            self._skip_ws()
+            char = self._peek()
+            if char == ",":
+                self.pos += 1
+                self._skip_ws()
+                if self._peek() == "}":
+                    self._note("removed trailing comma")
+            elif char not in ("}", ""):
+                raise ArticleRepairError(f"expected ',' or '}}' after '{key}', got {char!r}")
+
+        if _FENCE.sub("", self.text[self.pos:]).strip():
+            self._note("stripped prose after the object")
+        return data, self.repairs
+
+    def _read_key(self):
+        end = self.text.find('"', self.pos)
+        if end == -1:
+            raise ArticleRepairError("truncated inside a key")
+        key = self.text[self.pos:end]
+        self.pos = end + 1
+        return key
+
+    def _read_value(self, key):
+        if self._peek() != '"':
+            # Numbers, booleans and null: take the raw token up to the next delimiter
+            match = re.compile(r"[^,}\s]+").match(self.text, self.pos)
+            if not match:
+                raise ArticleRepairError(f"missing value for '{key}'")
+            self.pos = match.end()
+            try:
+                return json.loads(match.group())
+            except json.JSONDecodeError:
+                raise ArticleRepairError(f"unparseable value for '{key}': {match.group()!r}")
+
+        self.pos += 1
+        parts = []
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            if char == "\\":
+                parts.append(self._read_escape())
+                continue
+            if char == '"':
+                if self._closes_string():
+                    self.pos += 1
+                    return "".join(parts)
+                # An HTML attribute quote the model forgot to escape
+                self._note("escaped unescaped quotes inside strings")
+                parts.append('"')
+            elif char in "\n\r\t":
+                self._note("escaped raw control characters")
+                parts.append(char)
+            else:
+                parts.append(char)
+            self.pos += 1
+        raise ArticleRepairError(f"output truncated inside '{key}'")
+
+    def _read_escape(self):
+        escape = self.text[self.pos + 1:self.pos + 2]
+        if escape in _ESCAPES:
+            if escape == "'":
+                # Not a JSON escape, but models write it for apostrophes
+                self._note("replaced \\' escapes with apostrophes")
+            self.pos += 2
+            return _ESCAPES[escape]
+        if escape == "u" and re.fullmatch(r"[0-9a-fA-F]{4}", self.text[self.pos + 2:self.pos + 6]):
+            code = self.text[self.pos + 2:self.pos + 6]
+            self.pos += 6
+            return chr(int(code, 16))
+        # e.g. a lone backslash in the HTML: keep it literally
+        self._note("kept invalid escapes literally")
+        self.pos += 1
+        return "\\"
+
+    def _closes_string(self):
+        # A quote ends the value only if what follows is the next key or the end of the object
+        after = self.pos + 1
+        while after < len(self.text) and self.text[after].isspace():
+            after += 1
+        if after >= len(self.text):
+            return True
+        char = self.text[after]
+        if char == ",":
+            match = _KEY_AHEAD.match(self.text, after + 1)
+            if match:
+                return self.expected_keys is None or match.group(1) in self.expected_keys
+            return self.text[after + 1:].lstrip().startswith("}")
+        if char == "}":
+            # Text after the brace is either prose around the object or more of the
+            # string (e.g. inline JSON in the HTML); only the last quote-brace can
+            # close the object
+            rest = self.text[after + 1:]
+            return not _FENCE.sub("", rest).strip() or not _QUOTE_BRACE.search(rest)
+        return False
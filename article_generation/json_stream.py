@@ -0,0 +1,131 @@
+REQUIRED_ARTICLE_KEYS = ("title", "meta_description", "slug", "excerpt", "content")
+
+_FENCE = "```json"
+# Chatter before the object that json_repair can still strip
+MAX_LEADING_PROSE = 500
+
+
+class OffFormatError(ValueError):
+    pass
+
+
+class IncrementalArticleValidator:
+    """
+    Checks the shape of a streamed article as it arrives: a JSON object
+    (optionally inside a ```json fence) with string values that covers
+    REQUIRED_ARTICLE_KEYS.
+
+    Anything json_repair can fix afterwards (unescaped quotes in the HTML,
+    trailing commas, a little prose around the object) is tolerated, so
+    feed() only raises OffFormatError for output that can't become an
+    article: a long preamble instead of JSON, or a required field that
+    isn't a string. finish() raises if the stream ended without the
+    required keys or with a value cut off mid-string.
+    """
+
+    def __init__(self, required_keys=REQUIRED_ARTICLE_KEYS):
+        self.required_keys = set(required_keys)
+        self.keys = []
+        self.state = "start"
+        self.leading = 0
+        self.buffer = []
+        self.escaped = False
+        self.complete = False
+
+    def feed(self, chunk):
+        for char in chunk:
+            self._step(char)
+
+    def finish(self):
+        missing = self.required_keys - set(self.keys)
+        if missing:
+            self._fail(f"stream ended without {sorted(missing)}")
+        if self.state in ("start", "in_key", "in_value", "colon", "value_start", "in_token") and not self.complete:
+            self._fail("stream ended inside the object")
+        self.complete = True
+
+    def _fail(self, reason):
+        raise OffFormatError(f"{reason} (state={self.state}, keys so far={self.keys})")
+
+    def _reopen_value(self, char):
+        # The quote that ended the value was really part of the text
+        self.state = "in_value"
+        self._step(char)
+
+    def _step(self, char):
+        state = self.state
+
+        if state in ("in_key", "in_value"):
+            if self.escaped:
+                self.escaped = False
+            elif char == "\\":
+                self.escaped = True
+            elif char == '"':
+                if state == "in_key":
+                    self.keys.append("".join(self.buffer))
+                    self.state = "colon"
+                else:
+                    self.state = "comma_or_end"
+                self.buffer = []
+                return
+            if state == "in_key":
+                self.buffer.append(char)
+                if len(self.buffer) > 64 or char == "\n":
+                    # Not a key after all; treat it as text inside the previous value
+                    self.buffer = []
+                    self.state = "in_value"
+            return
+
+        if char.isspace():
+            return
+
+        if state == "start":
+            if char == "{":
+                self.state = "key_or_end"
+                return
+            self.leading += 1
+            if self.leading > MAX_LEADING_PROSE:
+                self._fail("no JSON object after a long preamble")
+        elif state == "key_or_end":
+            if char == '"':
+                self.state = "in_key"
+            elif char == "}":
+                self._close()
+            elif self.keys:
+                self._reopen_value(char)
+            else:
+                self._fail(f"expected a key, got {char!r}")
+        elif state == "colon":
+            if char == ":":
+                self.state = "value_start"
+            else:
+                self.keys.pop()
+                self._reopen_value(char)
+        elif state == "value_start":
+            if char == '"':
+                self.state = "in_value"
+            elif self.keys[-1] in self.required_keys:
+                self._fail(f"expected a string value for '{self.keys[-1]}', got {char!r}")
+            else:
+                self.state = "in_token"
+        elif state == "in_token":
+            if char == ",":
+                self.state = "key_or_end"
+            elif char == "}":
+                self._close()
+        elif state == "comma_or_end":
+            if char == ",":
+                self.state = "key_or_end"
+            elif char == "}":
+                self._close()
+            else:
+                self._reopen_value(char)
+        elif state == "done":
+            if char not in "`json":
+                # Either prose after the object or a brace inside the content
+                self.state = "in_value"
+
+    def _close(self):
+        if self.required_keys <= set(self.keys):
+            self.complete = True
+        self.state = "done"
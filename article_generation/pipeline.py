@@ -0,0 +1,99 @@
+import queue
+import threading
+import time
+
+from run_metrics import span
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of the article pipeline. fn takes an item and returns the item
+    for the next stage, or None to drop it (the stage logs its own failure).
+    """
+
+    def __init__(self, name, fn, workers=1):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, ok, seconds):
+        with self.lock:
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+            self.busy_seconds += seconds
+
+    def report(self, wall_seconds):
+        handled = self.processed + self.failed
+        # Utilization near 100% means this stage is the bottleneck
+        utilization = self.busy_seconds / (wall_seconds * self.workers) if wall_seconds else 0.0
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 2),
+            "items_per_minute": round(handled / wall_seconds * 60, 2) if wall_seconds else 0.0,
+            "utilization": round(utilization, 3),
+        }
+
+
+def _run_worker(stage, inbox, outbox):
+    while True:
+        item = inbox.get()
+        if item is _DONE:
+            return
+        start_time = time.perf_counter()
+        try:
+            with span("pipeline_stage", stage=stage.name):
+                result = stage.fn(item)
+        except Exception as e:
+            print(f"Unexpected error in {stage.name} stage: {e}")
+            result = None
+        stage.record(result is not None, time.perf_counter() - start_time)
+        if result is not None:
+            outbox.put(result)
+
+
+def run_pipeline(items, stages):
+    # Stages are connected by queues so later stages start on finished items
+    # while earlier ones are still working on the rest.
+    queues = [queue.Queue() for _ in range(len(stages) + 1)]
+    for item in items:
+        queues[0].put(item)
+
+    start_time = time.perf_counter()
+    stage_threads = []
+    for index, stage in enumerate(stages):
+        threads = [
+            threading.Thread(
+                target=_run_worker, args=(stage, queues[index], queues[index + 1]),
+                name=f"{stage.name}-{n}", daemon=True,
+            )
+            for n in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        stage_threads.append(threads)
+
+    # Shut stages down in order: once every worker of a stage has exited,
+    # its output queue holds everything the next stage will ever get.
+    for index, threads in enumerate(stage_threads):
+        for _ in threads:
+            queues[index].put(_DONE)
+        for thread in threads:
+            thread.join()
+
+    wall_seconds = time.perf_counter() - start_time
+    results = []
+    while not queues[-1].empty():
+        results.append(queues[-1].get())
+    return results, [stage.report(wall_seconds) for stage in stages]
@@ -0,0 +1,128 @@
+import json
+import os
+import sys
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generate_articles
+from batch_mode import download_batch_results, submit_batch, wait_for_batch, write_batch_file
+from fake_openai_server import start_fake_server
+
+
+class InMemoryStore:
+    # Stands in for the article_batches / article_generations parts of ArticleStore
+    def __init__(self):
+        self.batches = {}
+        self.completions = {}
+        self.articles = {}
+        self.failures = {}
+
+    def get_many(self, request_hashes):
+        return {
+            request_hash: {
+                "raw_completion": self.completions[request_hash],
+                "generate_status": "done",
+                "validate_status": "done" if request_hash in self.articles else "pending",
+                "publish_status": "pending",
+                "published_link": None,
+                "article": self.articles.get(request_hash),
+            }
+            for request_hash in request_hashes if request_hash in self.completions
+        }
+
+    def get_pending_batch(self):
+        pending = [batch for batch in self.batches.values() if batch["status"] == "pending"]
+        return {"batch_id": pending[0]["batch_id"], "keywords": dict(pending[0]["keywords"])} if pending else None
+
+    def save_batch(self, batch_id, keywords):
+        self.batches[batch_id] = {"batch_id": batch_id, "keywords": dict(keywords), "status": "pending"}
+
+    def finish_batch(self, batch_id, status):
+        self.batches[batch_id]["status"] = status
+
+    def save_completions(self, completions):
+        for request_hash, _, _, raw_completion in completions:
+            self.completions[request_hash] = raw_completion
+
+    def save_articles(self, articles):
+        for request_hash, _, article in articles:
+            self.articles[request_hash] = article
+
+    def mark_failed(self, request_hash, stage, error):
+        self.failures[request_hash] = (stage, error)
+
+
+def test_submit_poll_download_round_trip(tmp_path):
+    server, base_url = start_fake_server(poll_count=1)
+    try:
+        bodies = {
+            f"article-{index}": generate_articles.build_article_request(keyword)
+            for index, keyword in enumerate(["standing desks", "air fryers"])
+        }
+        path = write_batch_file(bodies, str(tmp_path / "batch.jsonl"))
+        with requests.Session() as session:
+            batch = submit_batch(session, base_url, "test-key", path)
+            batch = wait_for_batch(session, base_url, "test-key", batch["id"], poll_seconds=0)
+            results = download_batch_results(session, base_url, "test-key", batch)
+    finally:
+        server.shutdown()
+
+    assert batch["status"] == "completed"
+    assert set(results) == set(bodies)
+    assert json.loads(results["article-1"])["slug"] == "air-fryers"
+
+
+def test_no_wait_runs_collect_the_pending_batch_instead_of_resubmitting(monkeypatch):
+    server, base_url = start_fake_server(poll_count=1)
+    monkeypatch.setattr(generate_articles, "OPENAI_BASE_URL", base_url)
+    monkeypatch.setattr(generate_articles, "BATCH_MAX_WAIT_SECONDS", 0)
+    monkeypatch.setattr(generate_articles, "BATCH_POLL_SECONDS", 1)
+    store = InMemoryStore()
+    try:
+        with requests.Session() as session:
+            # First run submits and finds the batch still in progress
+            items = [generate_articles.prepare_item(keyword) for keyword in ["standing desks", "air fryers"]]
+            state = generate_articles.submit_article_batch(session, store, items)
+            assert generate_articles.collect_article_batch(session, store, state) is None
+
+            # The next run picks the same batch up from the store and collects it
+            pending = store.get_pending_batch()
+            assert pending["batch_id"] == state["batch_id"]
+            collected = generate_articles.collect_article_batch(session, store, pending)
+    finally:
+        server.shutdown()
+
+    assert len(store.batches) == 1
+    assert store.get_pending_batch() is None
+    assert store.batches[state["batch_id"]]["status"] == "completed"
+    assert sorted(item["keyword"] for item in collected) == ["air fryers", "standing desks"]
+    assert set(store.articles) == {item["hash"] for item in items}
+    assert not store.failures
+
+
+def test_weekly_runs_collect_last_weeks_batch_and_submit_this_weeks(monkeypatch):
+    server, base_url = start_fake_server(poll_count=1)
+    monkeypatch.setattr(generate_articles, "OPENAI_BASE_URL", base_url)
+    monkeypatch.setattr(generate_articles, "BATCH_MAX_WAIT_SECONDS", 0)
+    monkeypatch.setattr(generate_articles, "BATCH_POLL_SECONDS", 1)
+    store = InMemoryStore()
+    weeks = iter([["standing desks", "air fryers"], ["air fryers", "robot vacuums"]])
+    monkeypatch.setattr(generate_articles, "fetch_recent_keywords", lambda: next(weeks))
+    try:
+        with requests.Session() as session:
+            assert generate_articles.advance_batches(session, store) == []
+            first_batch = store.get_pending_batch()["batch_id"]
+
+            ready = generate_articles.advance_batches(session, store)
+    finally:
+        server.shutdown()
+
+    # Last week's batch is published and this week's new keyword is submitted in the same run
+    assert store.batches[first_batch]["status"] == "completed"
+    assert sorted(item["keyword"] for item in ready) == ["air fryers", "standing desks"]
+    pending = store.get_pending_batch()
+    assert pending["batch_id"] != first_batch
+    assert list(pending["keywords"].values()) == ["robot vacuums"]
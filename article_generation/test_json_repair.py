@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from json_repair import ArticleRepairError, load_article_json
+from json_stream import REQUIRED_ARTICLE_KEYS
+
+ARTICLE = {
+    "title": "Standing Desks",
+    "meta_description": "Why standing desks matter.",
+    "slug": "standing-desks",
+    "excerpt": "A closer look.",
+    "content": "<p>Stand up.</p>",
+}
+
+
+def test_valid_json_needs_no_repairs():
+    assert load_article_json(json.dumps(ARTICLE), REQUIRED_ARTICLE_KEYS) == (ARTICLE, [])
+
+
+def test_prose_after_the_object_is_stripped():
+    data, repairs = load_article_json(json.dumps(ARTICLE) + "\n\nHope this helps!", REQUIRED_ARTICLE_KEYS)
+    assert data == ARTICLE
+    assert repairs == ["stripped prose after the object"]
+
+
+def test_prose_after_a_closing_fence_is_stripped():
+    text = "```json\n" + json.dumps(ARTICLE) + "\n```\nLet me know if you want changes."
+    data, repairs = load_article_json(text, REQUIRED_ARTICLE_KEYS)
+    assert data == ARTICLE
+    assert repairs == ["stripped prose after the object"]
+
+
+def test_inline_json_in_the_content_stays_in_the_string():
+    text = json.dumps(dict(ARTICLE, content="CONTENT"))
+    text = text.replace('"CONTENT"', '"<p>json {"a": "b"} end</p>"')
+    data, repairs = load_article_json(text, REQUIRED_ARTICLE_KEYS)
+    assert data["content"] == '<p>json {"a": "b"} end</p>'
+    assert repairs == ["escaped unescaped quotes inside strings"]
+
+
+def test_unescaped_attribute_quotes_are_kept():
+    text = json.dumps(dict(ARTICLE, content="CONTENT")).replace('"CONTENT"', '"<p class="lead">Hi</p>"')
+    data, _ = load_article_json(text, REQUIRED_ARTICLE_KEYS)
+    assert data["content"] == '<p class="lead">Hi</p>'
+
+
+def test_apostrophe_escapes_are_reported():
+    text = json.dumps(dict(ARTICLE, content="CONTENT")).replace('"CONTENT"', '"it\\\'s"')
+    data, repairs = load_article_json(text, REQUIRED_ARTICLE_KEYS)
+    assert data["content"] == "it's"
+    assert repairs == ["replaced \\' escapes with apostrophes"]
+
+
+def test_truncated_string_is_unrepairable():
+    with pytest.raises(ArticleRepairError):
+        load_article_json('{"title": "Standing Desks", "content": "<p>Stand', REQUIRED_ARTICLE_KEYS)
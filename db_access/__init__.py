@@ -0,0 +1,14 @@
+# __init__.py
+
+__all__ = [
+    "ConnectionPool",
+    "get_pool",
+    "close_pool",
+    "connection",
+    "transaction",
+    "server_side_cursor",
+    "bulk_insert",
+    "copy_rows",
+]
+from .pool import ConnectionPool, get_pool, close_pool, connection, transaction, server_side_cursor
+from .bulk import bulk_insert, copy_rows
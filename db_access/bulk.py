@@ -0,0 +1,43 @@
+import io
+from datetime import date, datetime
+
+from psycopg2.extras import execute_values
+
+
+def bulk_insert(cur, table, columns, rows, on_conflict="", returning="", page_size=1000):
+    """
+    Insert rows with one multi-row INSERT per page_size rows.
+
+    on_conflict and returning are appended verbatim, e.g.
+    "ON CONFLICT (term) DO NOTHING" or "RETURNING id". Returns the
+    RETURNING rows (in insertion order) when requested.
+    """
+    if not rows:
+        return []
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s {on_conflict} {returning}"
+    return execute_values(cur, query, rows, page_size=page_size, fetch=bool(returning)) or []
+
+
+def _csv_field(value):
+    # COPY's CSV format reads an unquoted empty field as NULL and a quoted one as ''
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def copy_rows(cur, table, columns, rows):
+    """
+    Append rows with COPY FROM STDIN. Faster than INSERT for large,
+    append-only loads, but has no ON CONFLICT handling.
+    """
+    if not rows:
+        return 0
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(_csv_field(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return len(rows)
@@ -0,0 +1,97 @@
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+from psycopg2.pool import ThreadedConnectionPool
+
+from run_metrics import span
+
+# Enough for every pipeline worker to hold a connection at once
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "8"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    ThreadedConnectionPool that makes callers wait for a free connection
+    instead of raising PoolError when every connection is checked out.
+    """
+
+    def __init__(self, dsn, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX):
+        self.pool = ThreadedConnectionPool(minconn, maxconn, dsn)
+        self.available = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self):
+        self.available.acquire()
+        try:
+            return self.pool.getconn()
+        except Exception:
+            self.available.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        try:
+            self.pool.putconn(conn, close=close)
+        finally:
+            self.available.release()
+
+    def closeall(self):
+        self.pool.closeall()
+
+
+def get_pool(dsn=None):
+    # One pool per process, created on first use
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            dsn = dsn or os.getenv("DB_CONNECTION_STRING")
+            if not dsn:
+                raise RuntimeError("DB_CONNECTION_STRING is not set")
+            _pool = ConnectionPool(dsn)
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+@contextmanager
+def connection():
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        if not conn.closed:
+            # Never hand the next caller a connection with an open transaction
+            conn.rollback()
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+@contextmanager
+def transaction(query="transaction"):
+    # Commits when the block succeeds, rolls back if it raises.
+    # Timed as db_query{query=...}, including the wait for a connection.
+    with span("db_query", query=query), connection() as conn:
+        with conn.cursor() as cur:
+            yield cur
+        conn.commit()
+
+
+@contextmanager
+def server_side_cursor(query="server_side_cursor", itersize=2000):
+    # Named cursor: rows stream from the server itersize at a time
+    # instead of the whole result set being loaded on execute()
+    with span("db_query", query=query), connection() as conn:
+        with conn.cursor(name=f"cursor_{uuid.uuid4().hex}") as cur:
+            cur.itersize = itersize
+            yield cur
+        conn.commit()
@@ -1,6 +1,30 @@
 -- WARNING: This schema is for context only and is not meant to be run.
 -- Table order and constraints may not be valid for execution.
 
+CREATE TABLE public.article_batches (
+  batch_id text NOT NULL,
+  keywords jsonb NOT NULL,
+  status text NOT NULL DEFAULT 'pending'::text,
+  submitted_at timestamp without time zone DEFAULT now(),
+  finished_at timestamp without time zone,
+  CONSTRAINT article_batches_pkey PRIMARY KEY (batch_id)
+);
+CREATE TABLE public.article_generations (
+  request_hash text NOT NULL,
+  keyword text NOT NULL,
+  model text NOT NULL,
+  raw_completion text,
+  article_id uuid,
+  generate_status text NOT NULL DEFAULT 'pending'::text,
+  validate_status text NOT NULL DEFAULT 'pending'::text,
+  publish_status text NOT NULL DEFAULT 'pending'::text,
+  published_link text,
+  last_error text,
+  created_at timestamp without time zone DEFAULT now(),
+  updated_at timestamp without time zone DEFAULT now(),
+  CONSTRAINT article_generations_pkey PRIMARY KEY (request_hash),
+  CONSTRAINT article_generations_article_id_fkey FOREIGN KEY (article_id) REFERENCES public.articles(id)
+);
 CREATE TABLE public.articles (
   title text NOT NULL,
   content text NOT NULL,
@@ -24,6 +48,9 @@ CREATE TABLE public.filtered_keywords (
   created_at timestamp without time zone DEFAULT now(),
   uuid uuid NOT NULL DEFAULT gen_random_uuid(),
   id integer NOT NULL DEFAULT nextval('filtered_keywords_id_seq'::regclass),
+  seed_keyword text,
+  location text,
+  lang text,
   CONSTRAINT filtered_keywords_pkey PRIMARY KEY (uuid)
 );
 CREATE TABLE public.intent_patterns (
@@ -32,6 +59,47 @@ CREATE TABLE public.intent_patterns (
   id integer NOT NULL DEFAULT nextval('intent_patterns_id_seq'::regclass),
   CONSTRAINT intent_patterns_pkey PRIMARY KEY (uuid)
 );
+CREATE TABLE public.keyword_candidates (
+  seed_keyword text NOT NULL,
+  seed_rank integer NOT NULL,
+  text text NOT NULL,
+  category text NOT NULL,
+  competition_level text,
+  volume integer DEFAULT 0,
+  trend double precision DEFAULT 0.0,
+  similarity double precision NOT NULL,
+  seeds_hash text NOT NULL,
+  updated_at timestamp without time zone DEFAULT now(),
+  location text NOT NULL DEFAULT 'GB'::text,
+  lang text NOT NULL DEFAULT 'en'::text,
+  CONSTRAINT keyword_candidates_pkey PRIMARY KEY (seed_keyword, seed_rank)
+);
+CREATE TABLE public.keyword_jobs (
+  id bigint NOT NULL DEFAULT nextval('keyword_jobs_id_seq'::regclass),
+  run_id text NOT NULL,
+  kind text NOT NULL CHECK (kind = ANY (ARRAY['fetch'::text, 'analyze'::text])),
+  seed_keyword text,
+  category text,
+  location text,
+  lang text,
+  position integer NOT NULL DEFAULT 0,
+  priority double precision NOT NULL DEFAULT 0.0,
+  status text NOT NULL DEFAULT 'pending'::text CHECK (status = ANY (ARRAY['pending'::text, 'running'::text, 'done'::text, 'failed'::text])),
+  attempts integer NOT NULL DEFAULT 0,
+  claimed_by text,
+  claimed_at timestamp without time zone,
+  finished_at timestamp without time zone,
+  error text,
+  created_at timestamp without time zone DEFAULT now(),
+  CONSTRAINT keyword_jobs_pkey PRIMARY KEY (id)
+);
+CREATE TABLE public.keyword_watermarks (
+  seed_keyword text NOT NULL,
+  processed_through timestamp without time zone NOT NULL,
+  seeds_hash text NOT NULL,
+  updated_at timestamp without time zone DEFAULT now(),
+  CONSTRAINT keyword_watermarks_pkey PRIMARY KEY (seed_keyword)
+);
 CREATE TABLE public.keywords (
   text text NOT NULL,
   volume integer NOT NULL,
@@ -50,6 +118,10 @@ CREATE TABLE public.raw_keywords (
   id integer NOT NULL DEFAULT nextval('raw_keywords_id_seq'::regclass),
   created_at timestamp without time zone DEFAULT now(),
   uuid uuid NOT NULL DEFAULT gen_random_uuid(),
+  seed_keyword text,
+  category text,
+  location text NOT NULL DEFAULT 'GB'::text,
+  lang text NOT NULL DEFAULT 'en'::text,
   CONSTRAINT raw_keywords_pkey PRIMARY KEY (uuid)
 );
 CREATE TABLE public.seed_keywords (
@@ -0,0 +1,6 @@
+-- Migration: Tag raw_keywords with their seed so the fetch cache can be tracked per seed
+ALTER TABLE raw_keywords ADD COLUMN IF NOT EXISTS seed_keyword TEXT;
+ALTER TABLE raw_keywords ADD COLUMN IF NOT EXISTS category TEXT;
+
+-- Optimize per-seed freshness lookups in fetch_cached_keywords
+CREATE INDEX IF NOT EXISTS idx_raw_keywords_seed_created_at ON raw_keywords (seed_keyword, created_at DESC);
@@ -0,0 +1,19 @@
+-- Migration: Track every article generation by a hash of its request so
+-- completed stages are reused instead of paying for a new generation
+CREATE TABLE IF NOT EXISTS article_generations (
+    request_hash TEXT PRIMARY KEY,
+    keyword TEXT NOT NULL,
+    model TEXT NOT NULL,
+    raw_completion TEXT,
+    article_id UUID REFERENCES articles (id),
+    generate_status TEXT NOT NULL DEFAULT 'pending',
+    validate_status TEXT NOT NULL DEFAULT 'pending',
+    publish_status TEXT NOT NULL DEFAULT 'pending',
+    published_link TEXT,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Optimize lookups of past generations for a keyword
+CREATE INDEX IF NOT EXISTS idx_article_generations_keyword ON article_generations (keyword);
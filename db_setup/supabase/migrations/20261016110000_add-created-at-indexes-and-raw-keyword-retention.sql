@@ -0,0 +1,42 @@
+-- Migration: Index the created_at filters used on every run and cap the
+-- growth of raw_keywords now that every fetch is persisted
+
+-- Present in production but never added by a migration
+ALTER TABLE blacklist ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW();
+
+-- fetch_blacklist: WHERE created_at >= cutoff, reading only term (index-only scan)
+CREATE INDEX IF NOT EXISTS idx_blacklist_created_at ON blacklist (created_at) INCLUDE (term);
+
+-- fetch_recent_keywords: ORDER BY created_at DESC LIMIT 10
+CREATE INDEX IF NOT EXISTS idx_filtered_keywords_created_at ON filtered_keywords (created_at DESC) INCLUDE (text);
+
+-- raw_keywords is append-only, so created_at follows the physical row order
+-- and a BRIN index covers time-range scans and the retention delete in a few pages.
+-- Per-seed lookups keep using idx_raw_keywords_seed_created_at.
+CREATE INDEX IF NOT EXISTS idx_raw_keywords_created_at_brin ON raw_keywords USING BRIN (created_at);
+
+-- Retention: drop raw rows older than the window. The fetch cache only reads
+-- the last 24 hours; the rest is kept for replays and analysis.
+CREATE OR REPLACE FUNCTION prune_raw_keywords(retention INTERVAL DEFAULT INTERVAL '30 days')
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    deleted BIGINT;
+BEGIN
+    -- created_at holds naive UTC timestamps (datetime.utcnow() in the pipeline)
+    DELETE FROM raw_keywords WHERE created_at < (NOW() AT TIME ZONE 'UTC') - retention;
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN deleted;
+END;
+$$;
+
+-- Run it nightly where pg_cron is enabled (Supabase: Database > Extensions).
+-- Elsewhere, schedule SELECT prune_raw_keywords(); externally.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('prune-raw-keywords', '30 3 * * *', 'SELECT prune_raw_keywords()');
+    END IF;
+END;
+$$;
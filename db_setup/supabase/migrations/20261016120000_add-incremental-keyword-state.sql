@@ -0,0 +1,24 @@
+-- Migration: State for incremental keyword runs. keyword_candidates holds the
+-- filtered candidates of each seed with their seed similarity, and
+-- keyword_watermarks the newest raw row already folded in for each seed.
+CREATE TABLE IF NOT EXISTS keyword_candidates (
+    seed_keyword TEXT NOT NULL,
+    seed_rank INT NOT NULL,
+    text TEXT NOT NULL,
+    category TEXT NOT NULL,
+    competition_level TEXT,
+    volume INT DEFAULT 0,
+    trend FLOAT DEFAULT 0.0,
+    similarity FLOAT NOT NULL,
+    -- Similarity is the max over every seed, so it is only valid for this seed set
+    seeds_hash TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (seed_keyword, seed_rank)
+);
+
+CREATE TABLE IF NOT EXISTS keyword_watermarks (
+    seed_keyword TEXT PRIMARY KEY,
+    processed_through TIMESTAMP NOT NULL,
+    seeds_hash TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
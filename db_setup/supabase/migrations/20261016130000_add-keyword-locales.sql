@@ -0,0 +1,13 @@
+-- Migration: Keep keyword results per market. Rows fetched before locales
+-- existed were all GB/en, which the defaults backfill.
+ALTER TABLE raw_keywords ADD COLUMN IF NOT EXISTS location TEXT NOT NULL DEFAULT 'GB';
+ALTER TABLE raw_keywords ADD COLUMN IF NOT EXISTS lang TEXT NOT NULL DEFAULT 'en';
+
+ALTER TABLE keyword_candidates ADD COLUMN IF NOT EXISTS location TEXT NOT NULL DEFAULT 'GB';
+ALTER TABLE keyword_candidates ADD COLUMN IF NOT EXISTS lang TEXT NOT NULL DEFAULT 'en';
+
+-- Selected keywords remember where they came from, so fetch_seed_priorities
+-- can order the next run's requests by each seed's past scores
+ALTER TABLE filtered_keywords ADD COLUMN IF NOT EXISTS seed_keyword TEXT;
+ALTER TABLE filtered_keywords ADD COLUMN IF NOT EXISTS location TEXT;
+ALTER TABLE filtered_keywords ADD COLUMN IF NOT EXISTS lang TEXT;
@@ -0,0 +1,32 @@
+-- Migration: Job queue for resident keyword workers. A run is one fetch job
+-- per seed and locale plus one analyze job; workers claim jobs with
+-- FOR UPDATE SKIP LOCKED, so several hosts can share a run.
+CREATE TABLE IF NOT EXISTS keyword_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('fetch', 'analyze')),
+    seed_keyword TEXT,
+    category TEXT,
+    location TEXT,
+    lang TEXT,
+    -- Rank within the job's locale, so claiming by position takes locales in turn
+    position INT NOT NULL DEFAULT 0,
+    priority FLOAT NOT NULL DEFAULT 0.0,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    attempts INT NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    -- Naive UTC like the rest of the pipeline's timestamps; renewed while a job runs
+    claimed_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- claim_fetch_jobs / claim_analyze_job: pending jobs in claim order
+CREATE INDEX IF NOT EXISTS idx_keyword_jobs_pending ON keyword_jobs (kind, position, id) WHERE status = 'pending';
+
+-- claim_analyze_job: unfinished fetch jobs of the same run
+CREATE INDEX IF NOT EXISTS idx_keyword_jobs_run ON keyword_jobs (run_id, kind, status);
+
+-- requeue_expired: running jobs by lease age
+CREATE INDEX IF NOT EXISTS idx_keyword_jobs_running ON keyword_jobs (claimed_at) WHERE status = 'running';
@@ -0,0 +1,12 @@
+-- Migration: Keep submitted Batch API jobs in the database, so a later run
+-- collects a pending batch instead of paying for a new one
+CREATE TABLE IF NOT EXISTS article_batches (
+    batch_id TEXT PRIMARY KEY,
+    keywords JSONB NOT NULL,  -- custom_id -> keyword for every request in the batch
+    status TEXT NOT NULL DEFAULT 'pending',  -- 'pending' until collected, then the batch's final status
+    submitted_at TIMESTAMP DEFAULT NOW(),
+    finished_at TIMESTAMP
+);
+
+-- Optimize the lookup of the batch still waiting to be collected
+CREATE INDEX IF NOT EXISTS idx_article_batches_pending ON article_batches (submitted_at) WHERE status = 'pending';
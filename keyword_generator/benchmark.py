@@ -0,0 +1,407 @@
+"""
+Offline benchmark for the keyword pipeline.
+
+Replays raw_keywords.json (optionally scaled up with synthetic variants)
+through a stubbed fetch_keywords_from_api, so no RapidAPI quota is spent,
+and times every stage with its peak traced memory:
+
+    fetch, ingest, filter, embed, score, cluster, select, persist
+
+The stub serves each response as JSON text parsed by the streaming ingest
+path, as a live response is, and ingest streams the whole replay as one
+offline dump through ingest_dump. The int8 and onnx backends also report
+embed's neighbour_agreement: the share of each candidate's top-5 fp32
+neighbours they keep.
+
+Persist runs against a throwaway "benchmark" schema on a local Postgres
+(--dsn or BENCHMARK_DB_URL, public tables migrated) and is skipped
+without one. Each scale runs in a fresh process so max RSS is per scale.
+Results are written as JSON; pass a previous file as --baseline to flag
+stages that got slower between commits.
+
+    python benchmark.py --scales 1,10,100 --embedding-backend hashing
+    python benchmark.py --baseline benchmark_results.json --output new.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from urllib.parse import urlparse
+
+import numpy as np
+
+import fetch_keywords
+from blacklist_index import BlacklistIndex
+from candidate_table import (
+    build_candidate_table,
+    filter_candidates,
+    materialize,
+    score_candidates,
+    select_by_category_distribution,
+)
+from clustering import CLUSTERING_METHODS, cluster_embeddings
+from embedding_backend import EMBEDDING_BACKENDS, get_embedding_backend, neighbour_agreement
+from embedding_cache import EmbeddingCache
+from rate_limiter import TokenBucket
+from stream_ingest import READ_SIZE, compact_rows, ingest_dump, iter_json_array, iter_json_file
+
+RAW_KEYWORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "raw_keywords.json")
+BENCHMARK_DB_URL = os.getenv("BENCHMARK_DB_URL")
+BENCHMARK_SCHEMA = "benchmark"
+PERSISTED_TABLES = ("raw_keywords", "filtered_keywords", "blacklist")
+LOCAL_HOSTS = (None, "127.0.0.1", "localhost", "::1")
+QUANTIZED_BACKENDS = ("int8", "onnx")
+# Candidates compared against the fp32 model's top-5 neighbours for those backends
+RANKING_SAMPLE_SIZE = 2000
+
+# The production seed list (db_setup seed data) with a category each
+REPLAY_SEEDS = {
+    "top gaming monitors": "gaming",
+    "nvidia rtx graphics cards": "engineering",
+    "rpg gaming tips": "gaming",
+    "pc building for gamers": "engineering",
+    "quantum technology in games": "crossover",
+    "cloud gaming services": "engineering",
+    "indie video games": "gaming",
+    "headsets for gaming": "lifestyle",
+    "4k gaming graphics cards": "engineering",
+    "ai in video games": "ai_ethics",
+    "popular gaming mice": "lifestyle",
+    "cyberpunk 2077 news": "gaming",
+    "portable gaming screens": "lifestyle",
+    "steam deck gaming tips": "gaming",
+    "affordable gaming pcs": "engineering",
+    "gaming chairs for comfort": "lifestyle",
+    "mechanical keyboards for gaming": "lifestyle",
+    "gpu tips for performance": "engineering",
+    "multiplayer role-playing games": "gaming",
+}
+# Synthetic variant i of a keyword is PREFIXES[i // 10] + text + SUFFIXES[i % 10]
+PREFIXES = ["", "best", "cheap", "new", "top", "used", "budget", "pro", "mini", "custom"]
+SUFFIXES = ["", "uk", "2025", "review", "deals", "vs", "guide", "for beginners", "alternatives", "near me"]
+BLACKLIST_FRACTION = 0.02
+
+
+def scale_records(records, factor, rng):
+    # Variant 0 is the original record; the rest get a modifier and jittered metrics
+    scaled = [dict(record) for record in records]
+    for variant in range(1, factor):
+        prefix, suffix = PREFIXES[variant // 10 % 10], SUFFIXES[variant % 10]
+        volume_jitter = rng.uniform(0.5, 1.5, len(records))
+        trend_jitter = rng.normal(0, 5, len(records))
+        for record, volume_scale, trend_shift in zip(records, volume_jitter, trend_jitter):
+            variant_record = dict(record)
+            variant_record["text"] = " ".join(part for part in (prefix, record["text"], suffix) if part)
+            variant_record["volume"] = int((record.get("volume") or 0) * volume_scale)
+            variant_record["trend"] = round((record.get("trend") or 0.0) + trend_shift, 2)
+            scaled.append(variant_record)
+    return scaled
+
+
+def build_replay(records, factor, rng):
+    """
+    Split the file into one contiguous chunk per seed (the file is in seed
+    order), scale each chunk, then split it again across the seed's
+    endpoints. Returns {(endpoint, seed): [records]}.
+    """
+    seeds = list(REPLAY_SEEDS)
+    chunks = np.array_split(np.arange(len(records)), len(seeds))
+    responses = {}
+    for seed, chunk in zip(seeds, chunks):
+        seed_records = scale_records([records[i] for i in chunk], factor, rng)
+        endpoints = [endpoint for endpoint, _ in fetch_keywords.build_seed_requests(seed)]
+        for endpoint, part in zip(endpoints, np.array_split(np.arange(len(seed_records)), len(endpoints))):
+            responses[(endpoint, seed)] = [seed_records[i] for i in part]
+    return responses
+
+
+def stub_fetch(responses):
+    # Bodies are encoded up front, so fetch times parsing them and not building them
+    bodies = {key: json.dumps(records) for key, records in responses.items()}
+
+    def fetch_keywords_from_api(endpoint, params):
+        # Parsed in READ_SIZE chunks, as fetch_keywords_from_api reads a streamed body
+        body = bodies.get((endpoint, params["keyword"]), "[]")
+        chunks = (body[start:start + READ_SIZE] for start in range(0, len(body), READ_SIZE))
+        return list(compact_rows(iter_json_array(chunks)))
+
+    return fetch_keywords_from_api
+
+
+def run_stage(stages, name, fn, trace=True):
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        seconds = time.perf_counter() - start_time
+        if trace:
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    stages[name] = {"seconds": round(seconds, 3)}
+    if trace:
+        stages[name]["peak_traced_mb"] = round(peak_bytes / 2 ** 20, 2)
+    print(f"⏱️  {name.ljust(8)} {seconds:8.3f}s")
+    return result
+
+
+def benchmark_db_dsn(dsn):
+    from psycopg2.extensions import make_dsn
+
+    return make_dsn(dsn, options=f"-c search_path={BENCHMARK_SCHEMA}")
+
+
+def prepare_benchmark_schema(dsn):
+    # Empty copies of the pipeline's tables, so real data is never touched
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {BENCHMARK_SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {BENCHMARK_SCHEMA}")
+            for table in PERSISTED_TABLES:
+                cur.execute(f"CREATE TABLE {BENCHMARK_SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def drop_benchmark_schema(dsn):
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {BENCHMARK_SCHEMA} CASCADE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_scale(factor, options):
+    records = list(compact_rows(iter_json_file(options["input"])))
+    responses = build_replay(records, factor, np.random.default_rng(42))
+    raw_rows = sum(len(rows) for rows in responses.values())
+    print(f"\n📊 Scale {factor}x: {raw_rows:,} raw keywords")
+
+    # Cold embedding cache per scale, so embed measures encoding and not cache hits
+    work_dir = tempfile.mkdtemp(prefix="keyword-benchmark-")
+    backend = get_embedding_backend(
+        options["embedding_backend"], fetch_keywords.EMBEDDING_MODEL_NAME,
+        batch_size=options["embedding_batch_size"], processes=options["embedding_processes"],
+        cache_dir=fetch_keywords.EMBEDDING_CACHE_DIR, onnx_file=fetch_keywords.EMBEDDING_ONNX_FILE,
+    )
+    fetch_keywords.EMBEDDING_BATCH_SIZE = options["embedding_batch_size"]
+    fetch_keywords.embedding_backend = backend
+    fetch_keywords.embedding_cache = EmbeddingCache(work_dir, backend.cache_name)
+    fetch_keywords.fetch_keywords_from_api = stub_fetch(responses)
+
+    # Model load and the sklearn import are one-off costs, kept out of the stages
+    start_time = time.perf_counter()
+    backend.encode(["warm up"])
+    import sklearn.cluster  # noqa: F401
+    warmup_seconds = round(time.perf_counter() - start_time, 3)
+
+    stages = {}
+    seeds = list(REPLAY_SEEDS)
+    results = run_stage(stages, "fetch", lambda: fetch_keywords.fetch_all_seeds_concurrently(
+        {(seed, fetch_keywords.DEFAULT_LOCALE): category for seed, category in REPLAY_SEEDS.items()},
+        limiter=TokenBucket(rate=1e9, capacity=1000)
+    ))
+    combined_data = [item for seed in seeds for item in results[(seed, fetch_keywords.DEFAULT_LOCALE)]]
+
+    # A slice of the replayed keywords plays the blacklist, so the semantic check has work to do
+    blacklist = {item["text"].strip().lower() for item in combined_data[::int(1 / BLACKLIST_FRACTION)]}
+
+    # The same rows as one offline dump, streamed through the row-wise filters
+    dump_path = os.path.join(work_dir, "replay.json")
+    with open(dump_path, "w") as f:
+        json.dump([record for records in responses.values() for record in records], f)
+    survivors = run_stage(stages, "ingest", lambda: ingest_dump(dump_path, "offline dump", "gaming", blacklist))
+    stages["ingest"]["rows_kept"] = len(survivors)
+
+    # Rule filters only, uncapped: the semantic blacklist check and the
+    # per-category cap run in score, so that embed holds all the encoding
+    # work. The final selection is the same as fetch_and_analyze_keywords'.
+    candidates = run_stage(stages, "filter", lambda: filter_candidates(
+        build_candidate_table(combined_data), blacklist, category_minimum=len(combined_data)
+    ))
+    run_stage(stages, "embed", lambda: fetch_keywords.embed_texts(
+        seeds + candidates["text"].tolist() + sorted(blacklist)
+    ))
+    # The cache starts cold, so everything in it was encoded by this stage
+    stages["embed"]["texts_per_second"] = round(
+        len(fetch_keywords.embedding_cache.index) / max(stages["embed"]["seconds"], 1e-3)
+    )
+
+    def score_stage():
+        index = BlacklistIndex(
+            fetch_keywords.embed_texts,
+            threshold=fetch_keywords.BLACKLIST_SIMILARITY_THRESHOLD,
+            ann_min_size=fetch_keywords.BLACKLIST_ANN_MIN_SIZE,
+        )
+        index.sync(blacklist)
+        filtered = filter_candidates(candidates, blacklist, near_duplicate_fn=index.matches)
+        similarities = fetch_keywords.calculate_similarity_batch(seeds, filtered["text"].tolist())
+        return filtered, score_candidates(filtered, similarities)
+
+    filtered, scored = run_stage(stages, "score", score_stage)
+    texts = filtered["text"].tolist()
+
+    if texts:
+        # cluster_embeddings traces its own memory
+        _, cluster_report = run_stage(stages, "cluster", lambda: cluster_embeddings(
+            fetch_keywords.embed_texts(texts), 10, options["clustering_method"]
+        ), trace=False)
+        stages["cluster"]["peak_traced_mb"] = cluster_report["peak_traced_mb"]
+
+    final_keywords = run_stage(stages, "select", lambda: materialize(
+        scored, combined_data, select_by_category_distribution(scored, fetch_keywords.CATEGORIES)
+    ))
+
+    if options["dsn"]:
+        from db_access import close_pool, get_pool, transaction
+
+        get_pool(benchmark_db_dsn(options["dsn"]))
+        with transaction() as cur:
+            cur.execute(f"TRUNCATE {', '.join(PERSISTED_TABLES)}")
+
+        def persist_stage():
+            fetch_keywords.save_raw_keywords(combined_data)
+            fetch_keywords.save_filtered_keywords(final_keywords)
+            fetch_keywords.insert_into_blacklist([kw["text"] for kw in final_keywords])
+
+        run_stage(stages, "persist", persist_stage)
+        close_pool()
+
+    result = {
+        "raw_keywords": raw_rows,
+        "filtered_keywords": len(filtered),
+        "selected_keywords": len(final_keywords),
+        "warmup_seconds": warmup_seconds,
+        "stages": stages,
+        # ru_maxrss is in KiB on Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+    }
+
+    # Quantized backends are checked against the fp32 model's nearest neighbours,
+    # after max RSS is taken so the second model doesn't count towards it
+    if options["embedding_backend"] in QUANTIZED_BACKENDS:
+        sample = candidates["text"].tolist()[:RANKING_SAMPLE_SIZE]
+        reference = get_embedding_backend("torch", fetch_keywords.EMBEDDING_MODEL_NAME,
+                                          batch_size=options["embedding_batch_size"])
+        stages["embed"]["neighbour_agreement"] = round(
+            neighbour_agreement(reference.encode(sample), fetch_keywords.embed_texts(sample)), 3
+        )
+        reference.close()
+    backend.close()
+
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_to_baseline(results, baseline, tolerance, min_seconds=0.05):
+    # A stage regresses when it is both tolerance x slower and measurably slower
+    regressions = []
+    for scale, current in results["scales"].items():
+        previous = baseline.get("scales", {}).get(scale)
+        if not previous:
+            continue
+        for stage, timing in current["stages"].items():
+            before = previous["stages"].get(stage)
+            if not before:
+                continue
+            ratio = timing["seconds"] / max(before["seconds"], 1e-3)
+            flag = ""
+            if ratio > tolerance and timing["seconds"] - before["seconds"] > min_seconds:
+                regressions.append(f"{scale}x {stage}")
+                flag = " ❌"
+            print(f"  {scale}x {stage.ljust(8)} {before['seconds']:8.3f}s -> {timing['seconds']:8.3f}s ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=RAW_KEYWORDS_FILE)
+    parser.add_argument("--scales", default="1,10,100", help="comma-separated replay multipliers")
+    parser.add_argument("--embedding-backend", default=fetch_keywords.EMBEDDING_BACKEND, choices=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--embedding-batch-size", type=int, default=fetch_keywords.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--embedding-processes", type=int, default=fetch_keywords.EMBEDDING_PROCESSES)
+    parser.add_argument("--clustering-method", default=fetch_keywords.CLUSTERING_METHOD, choices=CLUSTERING_METHODS)
+    parser.add_argument("--dsn", default=BENCHMARK_DB_URL, help="local Postgres for the persist stage")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    args = parser.parse_args()
+
+    if args.dsn and urlparse(args.dsn).hostname not in LOCAL_HOSTS:
+        sys.exit(f"Refusing to benchmark against non-local host in {args.dsn!r}")
+
+    options = {
+        "input": args.input,
+        "embedding_backend": args.embedding_backend,
+        "embedding_batch_size": args.embedding_batch_size,
+        "embedding_processes": args.embedding_processes,
+        "clustering_method": args.clustering_method,
+        "dsn": args.dsn,
+    }
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "embedding_backend": args.embedding_backend,
+        "embedding_batch_size": args.embedding_batch_size,
+        "embedding_processes": args.embedding_processes,
+        "clustering_method": args.clustering_method,
+        "scales": {},
+    }
+
+    if args.dsn:
+        prepare_benchmark_schema(args.dsn)
+    else:
+        print("⚠️ No --dsn/BENCHMARK_DB_URL given; skipping the persist stage.")
+    try:
+        for factor in (int(scale) for scale in args.scales.split(",")):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                results["scales"][str(factor)] = executor.submit(run_scale, factor, options).result()
+    finally:
+        if args.dsn:
+            drop_benchmark_schema(args.dsn)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} ({baseline.get('commit')}):")
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            sys.exit(f"Regressions over {args.tolerance}x: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import json
+import os
+
+import numpy as np
+
+from embedding_cache import normalize_rows
+
+try:
+    import hnswlib
+except ImportError:  # Optional: exact search is used when hnswlib isn't installed
+    hnswlib = None
+
+
+class BlacklistIndex:
+    """
+    Vector index over blacklist embeddings for catching paraphrases of
+    keywords we already published.
+
+    Small blacklists are searched exactly with a matrix product; once the
+    number of terms passes ann_min_size (and hnswlib is available) the
+    vectors move into an HNSW graph. Terms are added and expired in place
+    and the state is saved between runs, so a run only embeds new terms.
+    """
+
+    def __init__(self, embed_fn, threshold=0.9, ann_min_size=50000, directory=None):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.ann_min_size = ann_min_size
+        self.directory = directory
+        self.terms = []
+        self.rows = {}
+        self.vectors = None
+        self.active = np.zeros(0, dtype=bool)
+        self.ann = None
+
+    def __len__(self):
+        return int(self.active.sum())
+
+    def add(self, terms):
+        new_terms = [term for term in dict.fromkeys(terms) if term not in self.rows]
+        reactivated = [self.rows[term] for term in terms if term in self.rows and not self.active[self.rows[term]]]
+        if reactivated:
+            self.active[reactivated] = True
+            if self.ann is not None:
+                for row in reactivated:
+                    self.ann.unmark_deleted(row)
+        if not new_terms:
+            return
+
+        vectors = normalize_rows(np.asarray(self.embed_fn(new_terms), dtype=np.float32))
+        start = len(self.terms)
+        for offset, term in enumerate(new_terms):
+            self.rows[term] = start + offset
+        self.terms.extend(new_terms)
+        self.vectors = vectors if self.vectors is None else np.vstack([self.vectors, vectors])
+        self.active = np.concatenate([self.active, np.ones(len(new_terms), dtype=bool)])
+
+        if self.ann is not None:
+            if self.ann.get_max_elements() < len(self.terms):
+                self.ann.resize_index(max(len(self.terms), 2 * self.ann.get_max_elements()))
+            self.ann.add_items(vectors, np.arange(start, len(self.terms)))
+        elif hnswlib is not None and len(self) >= self.ann_min_size:
+            self._build_ann()
+
+    def remove(self, terms):
+        rows = [self.rows[term] for term in terms if term in self.rows and self.active[self.rows[term]]]
+        if not rows:
+            return
+        self.active[rows] = False
+        if self.ann is not None:
+            for row in rows:
+                self.ann.mark_deleted(row)
+
+    def sync(self, terms):
+        # Bring the index in line with the current (unexpired) blacklist
+        terms = set(terms)
+        self.remove([term for term in self.terms if term not in terms])
+        self.add(sorted(terms))
+
+    def _build_ann(self):
+        print(f"Building HNSW blacklist index over {len(self)} terms...")
+        self.ann = hnswlib.Index(space="cosine", dim=self.vectors.shape[1])
+        self.ann.init_index(max_elements=max(len(self.terms), 1024), ef_construction=200, M=16)
+        self.ann.set_ef(64)
+        self.ann.add_items(self.vectors, np.arange(len(self.terms)))
+        for row in np.flatnonzero(~self.active):
+            self.ann.mark_deleted(int(row))
+
+    def max_similarity(self, texts, batch_size=4096):
+        similarities = np.zeros(len(texts), dtype=np.float32)
+        if not len(texts) or not len(self):
+            return similarities
+
+        queries = normalize_rows(np.asarray(self.embed_fn(list(texts)), dtype=np.float32))
+        if self.ann is not None:
+            _, distances = self.ann.knn_query(queries, k=1)
+            return 1.0 - distances[:, 0]
+
+        active_vectors = self.vectors[self.active]
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            similarities[start:start + batch_size] = (batch @ active_vectors.T).max(axis=1)
+        return similarities
+
+    def matches(self, texts):
+        return self.max_similarity(texts) >= self.threshold
+
+    def save(self):
+        if not self.directory or self.vectors is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "terms.json"), "w") as f:
+            json.dump({"terms": self.terms, "active": self.active.tolist()}, f)
+        np.save(os.path.join(self.directory, "vectors.npy"), self.vectors)
+        ann_path = os.path.join(self.directory, "hnsw.bin")
+        if self.ann is not None:
+            self.ann.save_index(ann_path)
+        elif os.path.exists(ann_path):
+            os.remove(ann_path)
+
+    def load(self):
+        terms_path = os.path.join(self.directory or "", "terms.json")
+        if not self.directory or not os.path.exists(terms_path):
+            return self
+        with open(terms_path) as f:
+            state = json.load(f)
+        self.terms = state["terms"]
+        self.rows = {term: row for row, term in enumerate(self.terms)}
+        self.active = np.array(state["active"], dtype=bool)
+        self.vectors = np.load(os.path.join(self.directory, "vectors.npy"))
+
+        ann_path = os.path.join(self.directory, "hnsw.bin")
+        if hnswlib is not None and os.path.exists(ann_path):
+            self.ann = hnswlib.Index(space="cosine", dim=self.vectors.shape[1])
+            self.ann.load_index(ann_path, max_elements=len(self.terms))
+            self.ann.set_ef(64)
+        return self
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+# Categories with fewer high-volume results get a looser volume threshold
+LOOSE_VOLUME_CATEGORIES = ["ai_ethics", "engineering", "crossover"]
+CATEGORY_MINIMUM = 15  # How many from each category you *try* to keep
+
+
+def build_candidate_table(rows):
+    # Columns hold everything the filter/score/select steps need; "row"
+    # points back at the original dict so only the winners are materialized.
+    table = pd.DataFrame({
+        "text": pd.Series([row.get("text") or "" for row in rows], dtype=object),
+        "category": pd.Series([row.get("category") or "uncategorized" for row in rows], dtype=object),
+        "competition_level": pd.Series([row.get("competition_level") or "" for row in rows], dtype=object),
+        "volume": np.array([row.get("volume") or 0 for row in rows], dtype=np.float64),
+        "trend": np.array([row.get("trend") or 0.0 for row in rows], dtype=np.float64),
+        "row": np.arange(len(rows)),
+    })
+    table["norm_text"] = table["text"].str.strip().str.lower()
+    return table
+
+
+def rule_mask(table, blacklist):
+    # Row-wise rules only, so they can also be applied chunk by chunk as rows stream in
+    volume_threshold = np.where(table["category"].isin(LOOSE_VOLUME_CATEGORIES), 50, 100)
+    return (
+        ~table["norm_text"].isin(list(blacklist))
+        & table["competition_level"].str.lower().isin(["low", "medium"])
+        & (table["trend"] >= 0)
+        & (table["norm_text"].str.split().str.len() >= 2)
+        & (table["volume"] > volume_threshold)
+    ).to_numpy()
+
+
+def filter_candidates(table, blacklist, category_minimum=CATEGORY_MINIMUM, near_duplicate_fn=None):
+    passed = table[rule_mask(table, blacklist)]
+
+    # Drop paraphrases of blacklisted terms before the per-category cap is applied
+    if near_duplicate_fn is not None and not passed.empty:
+        near_duplicates = near_duplicate_fn(passed["text"].tolist())
+        print(f"{int(near_duplicates.sum())} keywords dropped as near-duplicates of blacklisted terms.")
+        passed = passed[~near_duplicates]
+
+    return cap_per_category(passed, category_minimum)
+
+
+def cap_per_category(table, category_minimum=CATEGORY_MINIMUM):
+    # Keep the first N per category, grouped by category in order of first appearance
+    capped = table[table.groupby("category", sort=False).cumcount() < category_minimum]
+    category_rank = pd.factorize(capped["category"])[0]
+    order = np.lexsort((np.arange(len(capped)), category_rank))
+    return capped.iloc[order].reset_index(drop=True)
+
+
+def score_candidates(table, similarities):
+    table = table.copy()
+    table["similarity"] = np.asarray(similarities, dtype=np.float64)
+    max_volume = table["volume"].max()
+    table["score"] = 0.5 * table["similarity"] + 0.4 * table["trend"] + 0.1 * (table["volume"] / max_volume)
+
+    # Descending, ties kept in input order like sorted(..., reverse=True)
+    order = np.argsort(-table["score"].to_numpy(), kind="stable")
+    table = table.iloc[order].reset_index(drop=True)
+
+    # Penalize texts that appear more than once, without re-sorting
+    repetitions = table.groupby(table["text"].str.lower(), sort=False)["text"].transform("size").to_numpy()
+    penalized = np.maximum(table["score"].to_numpy() - 0.1 * (repetitions - 1), 0)
+    table["score"] = np.where(repetitions > 1, penalized, table["score"].to_numpy())
+    return table
+
+
+def top_k_positions(scores, k):
+    # Positions of the k highest scores; ties go to the earlier position
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        kth = np.partition(-scores, k - 1)[k - 1]
+        candidates = np.flatnonzero(-scores <= kth)
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order][:k]
+
+
+def select_by_category_distribution(table, categories, per_category_limit=2, total_limit=10):
+    scores = table["score"].to_numpy()
+    norm_texts = table["norm_text"].to_numpy()
+    category_codes = pd.factorize(table["category"])[0]
+    by_category = np.argsort(category_codes, kind="stable")
+    boundaries = np.flatnonzero(np.diff(category_codes[by_category])) + 1
+    groups = {
+        table["category"].iat[positions[0]]: positions
+        for positions in np.split(by_category, boundaries) if len(positions)
+    }
+
+    selected = []
+    seen_texts = set()
+
+    def take(position):
+        if norm_texts[position] not in seen_texts and len(selected) < total_limit:
+            selected.append(position)
+            seen_texts.add(norm_texts[position])
+
+    for cat in categories:
+        positions = groups.get(cat)
+        if positions is None:
+            continue
+        for local in top_k_positions(scores[positions], per_category_limit):
+            take(positions[local])
+
+    # Fallback to fill up remaining slots, walking buckets in first-appearance order
+    bucket_order = np.concatenate(list(groups.values())) if groups else np.empty(0, dtype=np.int64)
+    k = total_limit * 2
+    while len(selected) < total_limit and len(bucket_order):
+        ranked = bucket_order[top_k_positions(scores[bucket_order], k)]
+        for position in ranked:
+            take(position)
+        if k >= len(bucket_order):
+            break
+        k *= 2
+
+    return selected
+
+
+def select_mmr(table, embeddings, categories, per_category_limit=2, total_limit=10, diversity=0.3):
+    """
+    Maximal-marginal-relevance selection: each pick maximizes
+    (1 - diversity) * relevance - diversity * (max similarity to the picks
+    so far), with relevance the min-max scaled score. Category quotas are
+    filled first as in select_by_category_distribution, then the rest of
+    total_limit from any category. Only the running max similarity per
+    candidate is kept, one matrix-vector product per pick, so memory stays
+    linear in the pool size. embeddings must be L2-normalized rows.
+    """
+    scores = table["score"].to_numpy(dtype=np.float64)
+    if not len(scores):
+        return []
+    spread = scores.max() - scores.min()
+    relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norm_codes = pd.factorize(table["norm_text"])[0]
+    category_codes, category_names = pd.factorize(table["category"])
+    quota = np.zeros(len(category_names), dtype=np.int64)
+    for cat in categories:
+        matches = np.flatnonzero(category_names == cat)
+        if len(matches):
+            quota[matches[0]] = per_category_limit
+
+    max_similarity = np.zeros(len(scores), dtype=np.float64)
+    available = np.ones(len(scores), dtype=bool)
+    selected = []
+
+    def pick(eligible):
+        marginal = np.where(eligible, (1 - diversity) * relevance - diversity * max_similarity, -np.inf)
+        position = int(np.argmax(marginal))
+        selected.append(position)
+        available[norm_codes == norm_codes[position]] = False
+        np.maximum(max_similarity, embeddings @ embeddings[position], out=max_similarity)
+        return position
+
+    # Category quotas first, then fill up from everything left
+    while len(selected) < total_limit:
+        eligible = available & (quota[category_codes] > 0)
+        if not eligible.any():
+            break
+        quota[category_codes[pick(eligible)]] -= 1
+    while len(selected) < total_limit and available.any():
+        pick(available)
+
+    return selected
+
+
+def materialize(table, rows, positions):
+    # Copy the computed columns onto the original dicts for the selected rows only
+    selected = []
+    for position in positions:
+        record = table.iloc[position]
+        row = rows[record["row"]]
+        row["similarity"] = float(record["similarity"])
+        row["score"] = float(record["score"])
+        selected.append(row)
+    return selected
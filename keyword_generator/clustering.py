@@ -0,0 +1,98 @@
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+
+from embedding_cache import normalize_rows
+
+CLUSTERING_METHODS = ["ward", "minibatch_kmeans", "density", "sample_assign"]
+
+
+def ward_labels(embeddings, num_clusters):
+    # Exact but O(n^2) in time and memory; fine up to a few thousand keywords
+    from sklearn.cluster import AgglomerativeClustering
+
+    clustering = AgglomerativeClustering(
+        n_clusters=num_clusters, metric="euclidean", linkage="ward"
+    )
+    return clustering.fit_predict(embeddings)
+
+
+def minibatch_kmeans_labels(embeddings, num_clusters, batch_size=2048, random_state=42):
+    from sklearn.cluster import MiniBatchKMeans
+
+    clustering = MiniBatchKMeans(
+        n_clusters=num_clusters, batch_size=batch_size, n_init=3, random_state=random_state
+    )
+    return clustering.fit_predict(embeddings)
+
+
+def density_labels(embeddings, min_similarity=0.8, min_samples=3):
+    # DBSCAN on unit vectors: euclidean distance d relates to cosine by d^2 = 2 - 2cos.
+    # Points in no dense region get label -1 and form their own "noise" cluster.
+    from sklearn.cluster import DBSCAN
+
+    eps = float(np.sqrt(2 * (1 - min_similarity)))
+    clustering = DBSCAN(eps=eps, min_samples=min_samples, algorithm="ball_tree", n_jobs=-1)
+    return clustering.fit_predict(normalize_rows(embeddings))
+
+
+def nearest_centroid(embeddings, centroids, batch_size=8192):
+    labels = np.empty(len(embeddings), dtype=np.int64)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(embeddings), batch_size):
+        batch = embeddings[start:start + batch_size]
+        # |x - c|^2 without the |x|^2 term, which is constant per row
+        distances = centroid_norms[None, :] - 2 * batch @ centroids.T
+        labels[start:start + batch_size] = distances.argmin(axis=1)
+    return labels
+
+
+def sample_assign_labels(embeddings, num_clusters, sample_size=5000, random_state=42):
+    # Ward on a random sample, then every keyword joins its nearest sample centroid
+    if len(embeddings) <= sample_size:
+        return ward_labels(embeddings, num_clusters)
+
+    rng = np.random.default_rng(random_state)
+    sample = rng.choice(len(embeddings), size=sample_size, replace=False)
+    sample_labels = ward_labels(embeddings[sample], num_clusters)
+    centroids = np.stack([
+        embeddings[sample][sample_labels == label].mean(axis=0)
+        for label in range(num_clusters)
+    ])
+    return nearest_centroid(embeddings, centroids)
+
+
+def cluster_embeddings(embeddings, num_clusters=10, method="ward"):
+    if method not in CLUSTERING_METHODS:
+        raise ValueError(f"Unknown clustering method '{method}'. Choose one of: {', '.join(CLUSTERING_METHODS)}")
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    num_clusters = min(num_clusters, len(embeddings))
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    try:
+        if method == "ward":
+            labels = ward_labels(embeddings, num_clusters)
+        elif method == "minibatch_kmeans":
+            labels = minibatch_kmeans_labels(embeddings, num_clusters)
+        elif method == "density":
+            labels = density_labels(embeddings)
+        else:
+            labels = sample_assign_labels(embeddings, num_clusters)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    report = {
+        "method": method,
+        "keywords": len(embeddings),
+        "clusters": int(len(set(labels.tolist()))),
+        "seconds": round(time.perf_counter() - start_time, 3),
+        "peak_traced_mb": round(peak_bytes / 2 ** 20, 2),
+        # ru_maxrss is in KiB on Linux and covers allocations tracemalloc can't see
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+    }
+    return labels, report
@@ -0,0 +1,225 @@
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+# Read by torch (OpenMP / MKL) when it starts, which in a pool worker is at spawn
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS")
+# AVX2 runs on every x86 CI runner; the repo also has avx512, avx512_vnni and arm64 files
+DEFAULT_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+class SentenceTransformerBackend:
+    """
+    Loads the SentenceTransformer model on first use so importing the
+    pipeline (tests, cache-only or dry runs) never pays the torch startup.
+
+    Texts are encoded shortest first in fixed-size batches, so each batch
+    pads to similar lengths. With processes > 1, large inputs are spread
+    over a pool of worker processes, started on first use and kept until
+    close(); the CPU threads (num_threads, or every core) are split between
+    them.
+    """
+
+    def __init__(self, model_name, batch_size=64, num_threads=0, processes=0, **_):
+        # cache_dir and onnx_file only apply to the int8 and ONNX backends
+        self.model_name = model_name
+        self.cache_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.processes = processes
+        self._model = None
+        self._pool = None
+
+    def _set_torch_threads(self):
+        if self.num_threads:
+            import torch
+
+            torch.set_num_threads(self.num_threads)
+
+    def _load_model(self):
+        from sentence_transformers import SentenceTransformer
+
+        self._set_torch_threads()
+        return SentenceTransformer(self.model_name, device="cpu")
+
+    @property
+    def model(self):
+        if self._model is None:
+            print(f"Loading {self.cache_name} embedding model...")
+            start_time = time.time()
+            self._model = self._load_model()
+            print(f"Model loaded in {time.time() - start_time:.2f} seconds.")
+        return self._model
+
+    def encode(self, texts):
+        if not texts:
+            return self.model.encode([], convert_to_numpy=True)
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        ordered = [texts[i] for i in order]
+
+        # Below a few batches per worker the pool costs more than it saves
+        if self.processes > 1 and len(texts) >= self.processes * self.batch_size * 4:
+            if self._pool is None:
+                self._pool = self._start_pool()
+            vectors = self.model.encode_multi_process(ordered, self._pool, batch_size=self.batch_size)
+        else:
+            vectors = self.model.encode(ordered, batch_size=self.batch_size, convert_to_numpy=True)
+
+        embeddings = np.empty_like(vectors)
+        embeddings[order] = vectors
+        return embeddings
+
+    def _start_pool(self):
+        # The pool takes no initializer, so each spawned worker gets its thread
+        # count through the environment it inherits
+        model = self.model
+        threads = max(1, (self.num_threads or os.cpu_count() or 1) // self.processes)
+        saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+        os.environ.update({name: str(threads) for name in THREAD_ENV_VARS})
+        try:
+            return model.start_multi_process_pool(["cpu"] * self.processes)
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    def close(self):
+        if self._pool is not None:
+            self._model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+
+class QuantizedSentenceTransformerBackend(SentenceTransformerBackend):
+    """
+    Same model with its Linear layers dynamically quantized to int8, which
+    keeps the cosine ranking while cutting CPU latency on CI runners.
+
+    Quantizing starts from the fp32 model, so with a cache_dir the result
+    is saved there on the first start and later starts load it directly.
+    The file is a pickle of the whole model, only read back by the torch
+    and sentence-transformers versions that wrote it.
+    """
+
+    def __init__(self, model_name, cache_dir=None, **options):
+        super().__init__(model_name, **options)
+        # Quantized vectors differ slightly, so they get their own cache
+        self.cache_name = f"{model_name}-int8"
+        self.cache_dir = cache_dir
+
+    def saved_model_path(self):
+        import sentence_transformers
+        import torch
+
+        versions = f"torch-{torch.__version__}-st-{sentence_transformers.__version__}"
+        file_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{self.cache_name}-{versions}.pt")
+        return os.path.join(self.cache_dir, "models", file_name)
+
+    def _load_model(self):
+        import torch
+
+        path = self.saved_model_path() if self.cache_dir else None
+        if path and os.path.exists(path):
+            self._set_torch_threads()
+            return torch.load(path, weights_only=False)
+
+        model = torch.quantization.quantize_dynamic(super()._load_model(), {torch.nn.Linear}, dtype=torch.qint8)
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            torch.save(model, f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+        return model
+
+
+class OnnxSentenceTransformerBackend(SentenceTransformerBackend):
+    """
+    Runs an int8 ONNX export of the model on ONNX Runtime, which needs
+    sentence-transformers[onnx]. all-MiniLM-L6-v2 ships pre-quantized
+    exports under onnx/ in its repo, so a start only downloads and opens
+    onnx_file; a model without that file is exported unquantized instead.
+
+    Runtime sessions cannot be sent to worker processes, so processes is
+    ignored and num_threads sets the runtime's intra-op threads.
+    """
+
+    def __init__(self, model_name, onnx_file=DEFAULT_ONNX_FILE, **options):
+        super().__init__(model_name, **options)
+        self.processes = 0
+        self.onnx_file = onnx_file
+        # Each export quantizes differently, so each gets its own cache
+        self.cache_name = f"{model_name}-{os.path.splitext(os.path.basename(onnx_file))[0]}"
+
+    def _load_model(self):
+        import onnxruntime
+        from sentence_transformers import SentenceTransformer
+
+        session_options = onnxruntime.SessionOptions()
+        if self.num_threads:
+            session_options.intra_op_num_threads = self.num_threads
+        return SentenceTransformer(
+            self.model_name, device="cpu", backend="onnx",
+            model_kwargs={"file_name": self.onnx_file, "session_options": session_options},
+        )
+
+
+class HashingBackend:
+    """
+    Deterministic bag-of-words and character-trigram hashing into the same
+    dimensionality as MiniLM. Not semantically meaningful; it lets the
+    benchmark and dry runs exercise the pipeline without the model.
+    """
+
+    def __init__(self, model_name, dim=384, **_):
+        # Batching and threading options only apply to the model backends
+        self.model_name = model_name
+        self.cache_name = f"hashing-{dim}"
+        self.dim = dim
+
+    def _features(self, text):
+        words = text.lower().split()
+        padded = f" {' '.join(words)} "
+        return words + [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    def encode(self, texts):
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                bucket = zlib.crc32(feature.encode())
+                embeddings[row, bucket % self.dim] += 1.0 if bucket & 1 << 31 else -1.0
+        return embeddings
+
+    def close(self):
+        pass
+
+
+EMBEDDING_BACKENDS = {
+    "torch": SentenceTransformerBackend,
+    "int8": QuantizedSentenceTransformerBackend,
+    "onnx": OnnxSentenceTransformerBackend,
+    "hashing": HashingBackend,
+}
+
+
+def neighbour_agreement(reference, candidate, k=5):
+    """
+    Mean share of each row's k nearest neighbours (by cosine) that two sets
+    of embeddings of the same texts agree on; 1.0 is an identical ranking.
+    """
+    def nearest(embeddings):
+        unit = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        similarity = unit @ unit.T
+        np.fill_diagonal(similarity, -np.inf)
+        return np.argsort(-similarity, axis=1, kind="stable")[:, :k]
+
+    pairs = zip(nearest(reference), nearest(candidate))
+    return float(np.mean([len(set(a) & set(b)) / len(a) for a, b in pairs]))
+
+
+def get_embedding_backend(name, model_name, **options):
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}'. Choose one of: {', '.join(EMBEDDING_BACKENDS)}")
+    return EMBEDDING_BACKENDS[name](model_name, **options)
@@ -0,0 +1,105 @@
+import json
+import os
+import re
+
+import numpy as np
+
+
+def normalize_text(text):
+    return " ".join(text.lower().split())
+
+
+def normalize_rows(embeddings):
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def _truncate(path, size):
+    if os.path.getsize(path) > size:
+        with open(path, "r+b") as f:
+            f.truncate(size)
+
+
+class EmbeddingCache:
+    """
+    Persistent text -> embedding store for one model.
+
+    Vectors live in an append-only float32 file that is memory-mapped on
+    load, with a parallel texts.jsonl holding the row order. Only texts not
+    already in the store are sent to the encoder.
+    """
+
+    def __init__(self, cache_dir, model_name):
+        self.model_name = model_name
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.texts_path = os.path.join(self.directory, "texts.jsonl")
+        self.meta_path = os.path.join(self.directory, "meta.json")
+        self.dim = None
+        self.index = {}
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path) as f:
+            self.dim = json.load(f)["dim"]
+
+        texts, text_ends = [], []
+        if os.path.exists(self.texts_path):
+            with open(self.texts_path, "rb") as f:
+                end = 0
+                for line in f:
+                    # A line cut off mid-write has no newline and is dropped
+                    if not line.endswith(b"\n"):
+                        break
+                    end += len(line)
+                    texts.append(json.loads(line))
+                    text_ends.append(end)
+
+        # A crash between the two appends can leave them out of step; keep the
+        # rows both files hold and cut the rest, so the next append lines up
+        rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        rows = min(rows, len(texts))
+        if os.path.exists(self.vectors_path):
+            _truncate(self.vectors_path, rows * 4 * self.dim)
+        if os.path.exists(self.texts_path):
+            _truncate(self.texts_path, text_ends[rows - 1] if rows else 0)
+        self.index = {text: row for row, text in enumerate(texts[:rows])}
+        self._map(rows)
+
+    def _map(self, rows):
+        if rows:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        else:
+            self.vectors = np.empty((0, self.dim or 0), dtype=np.float32)
+
+    def _append(self, texts, vectors):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            with open(self.meta_path, "w") as f:
+                json.dump({"model": self.model_name, "dim": self.dim}, f)
+
+        start = len(self.index)
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(self.texts_path, "a") as f:
+            for text in texts:
+                f.write(json.dumps(text) + "\n")
+
+        for offset, text in enumerate(texts):
+            self.index[text] = start + offset
+        self._map(len(self.index))
+
+    def encode(self, texts, encode_fn):
+        keys = [normalize_text(text) for text in texts]
+        misses = list(dict.fromkeys(key for key in keys if key not in self.index))
+        if misses:
+            print(f"Encoding {len(misses)} uncached texts out of {len(keys)}...")
+            self._append(misses, np.asarray(encode_fn(misses), dtype=np.float32))
+
+        if not keys:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self.vectors[[self.index[key] for key in keys]])
@@ -3,32 +3,129 @@ import requests
 from collections import Counter
 from collections import defaultdict
 import os
-from concurrent.futures import ThreadPoolExecutor
+import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
-from sklearn.cluster import AgglomerativeClustering
-from sentence_transformers import SentenceTransformer, util
 import json
 from datetime import datetime, timedelta
-import psycopg2
+import socket
+import sys
+import threading
+import numpy as np
+
+# Repo root, for the shared db_access and run_metrics packages (also used by local modules below)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from candidate_table import (
+    build_candidate_table,
+    filter_candidates,
+    materialize,
+    score_candidates,
+    select_by_category_distribution,
+    select_mmr,
+)
+from clustering import cluster_embeddings
+from embedding_backend import DEFAULT_ONNX_FILE, get_embedding_backend
+from blacklist_index import BlacklistIndex
+from embedding_cache import EmbeddingCache, normalize_rows
+from incremental import IncrementalState
+from job_queue import KeywordJobQueue
+from quota_scheduler import FairQuotaScheduler
+from rate_limiter import TokenBucket
+from seed_crawler import SeedExpansionCrawler
+from trends_enrichment import StubTrendsClient, TrendsCache, TrendspyClient, enrich_with_trends
+from stream_ingest import READ_SIZE, compact_rows, iter_json_array, prefilter_rows
+
+from db_access import bulk_insert, close_pool, copy_rows, get_pool, server_side_cursor, transaction
+from run_metrics import increment, metrics, set_gauge, span, write_run_report
 
 # API and configuration
 RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY")
 RAPIDAPI_HOST = os.getenv("RAPIDAPI_HOST")
 CACHE_EXPIRATION_HOURS = 24
+# Plan quota shared by all fetch workers (default matches the old 6s spacing)
+RAPIDAPI_REQUESTS_PER_SECOND = float(os.getenv("RAPIDAPI_REQUESTS_PER_SECOND", "0.16"))
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "4"))
+# Markets every seed is fetched for, as LOCATION:lang pairs ("GB:en,US:en,DE:de").
+# Non-English languages need a multilingual EMBEDDING_MODEL_NAME to score well.
+DEFAULT_LOCALE = ("GB", "en")
+KEYWORD_LOCALES = os.getenv("KEYWORD_LOCALES", "GB:en")
+# How far back filtered_keywords scores count towards a seed's fetch priority
+SEED_PRIORITY_DAYS = int(os.getenv("SEED_PRIORITY_DAYS", "90"))
+# RapidAPI requests a run may spend crawling outward from its best results (0 disables)
+KEYWORD_EXPANSION_BUDGET = int(os.getenv("KEYWORD_EXPANSION_BUDGET", "0"))
+# Weight of semantic distance from explored seeds against score when ranking the frontier
+EXPANSION_NOVELTY_WEIGHT = float(os.getenv("EXPANSION_NOVELTY_WEIGHT", "0.5"))
 OUTPUT_FILE = "keywords.json"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache")
+# "torch" for the stock model, "int8" for the dynamically quantized CPU variant (saved
+# under EMBEDDING_CACHE_DIR after the first run), "onnx" for a pre-quantized ONNX export
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Which of the model repo's ONNX files the onnx backend loads
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", DEFAULT_ONNX_FILE)
+# Texts per encode batch; tune against the texts/sec the run reports
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Torch intra-op threads (0 keeps torch's default), shared out between encoder processes (0 or 1 encodes in-process)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", "0"))
+# One of clustering.CLUSTERING_METHODS; ward is exact but quadratic in memory
+CLUSTERING_METHOD = os.getenv("CLUSTERING_METHOD", "ward")
+# Candidates at least this similar to a blacklisted term count as repeats
+BLACKLIST_SIMILARITY_THRESHOLD = float(os.getenv("BLACKLIST_SIMILARITY_THRESHOLD", "0.9"))
+# Switch from exact matrix search to HNSW (if hnswlib is installed) past this many terms
+BLACKLIST_ANN_MIN_SIZE = int(os.getenv("BLACKLIST_ANN_MIN_SIZE", "50000"))
+# Only refilter and re-embed seeds with new raw rows, reusing stored candidates for the rest
+KEYWORD_INCREMENTAL = os.getenv("KEYWORD_INCREMENTAL", "0") != "0"
+
+# "category" picks the top scores per category; "mmr" also trades score
+# against similarity to keywords already picked, so paraphrases don't crowd the list
+SELECTION_METHOD = os.getenv("SELECTION_METHOD", "category")
+MMR_DIVERSITY = float(os.getenv("MMR_DIVERSITY", "0.3"))
+
+# Google Trends momentum for the top-scored candidates: "trendspy", "stub" (offline) or "off"
+TRENDS_ENRICHMENT = os.getenv("TRENDS_ENRICHMENT", "off")
+TRENDS_SHORTLIST = int(os.getenv("TRENDS_SHORTLIST", "50"))
+# Score per percentage point of momentum (recent vs previous 4-week interest, clipped to
+# +/-100%), on the same scale as the 0.4 the scorer gives the API's percent trend
+TRENDS_WEIGHT = float(os.getenv("TRENDS_WEIGHT", "0.2"))
+TRENDS_TIMEFRAME = os.getenv("TRENDS_TIMEFRAME", "today 3-m")
+TRENDS_CACHE_DIR = os.getenv("TRENDS_CACHE_DIR", ".trends_cache")
+TRENDS_CACHE_TTL_HOURS = float(os.getenv("TRENDS_CACHE_TTL_HOURS", "72"))
+TRENDS_REQUESTS_PER_SECOND = float(os.getenv("TRENDS_REQUESTS_PER_SECOND", "0.2"))
+TRENDS_MAX_WORKERS = int(os.getenv("TRENDS_MAX_WORKERS", "2"))
+
+# Seed-defined categories the final selection is balanced across
+CATEGORIES = ["lifestyle", "ai_ethics", "engineering", "gaming", "crossover"]
+
+# "run" does a whole run in this process, "enqueue" queues one on keyword_jobs,
+# "worker" stays resident and works through queued jobs
+KEYWORD_MODE = os.getenv("KEYWORD_MODE", "run")
+# Seconds an idle worker waits before polling the queue again; 0 exits once the queue is empty
+KEYWORD_WORKER_POLL_SECONDS = float(os.getenv("KEYWORD_WORKER_POLL_SECONDS", "30"))
+# A claimed job nobody renews for this long is handed to another worker
+KEYWORD_JOB_LEASE_SECONDS = int(os.getenv("KEYWORD_JOB_LEASE_SECONDS", "900"))
+KEYWORD_JOB_MAX_ATTEMPTS = int(os.getenv("KEYWORD_JOB_MAX_ATTEMPTS", "3"))
 
 # Database connection details
 DB_CONNECTION_STRING = os.getenv("DB_CONNECTION_STRING")
 
-# Load the SentenceTransformer model
-print("Loading SentenceTransformer model...")
-start_time = time.time()
-model = SentenceTransformer("all-MiniLM-L6-v2")
-print(f"Model loaded in {time.time() - start_time:.2f} seconds.")
+# The model itself is only loaded the first time a cache miss needs encoding
+embedding_backend = get_embedding_backend(
+    EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME,
+    batch_size=EMBEDDING_BATCH_SIZE, num_threads=EMBEDDING_THREADS, processes=EMBEDDING_PROCESSES,
+    cache_dir=EMBEDDING_CACHE_DIR, onnx_file=EMBEDDING_ONNX_FILE,
+)
+
+# Shared by every embedding call in the run and persisted between runs
+embedding_cache = None
 
 # Helper functions
 
 
+class RateLimitError(requests.exceptions.RequestException):
+    pass
+
+
 def fetch_keywords_from_api(endpoint, params):
     url = f"https://{RAPIDAPI_HOST}/{endpoint}/"
     headers = {
@@ -37,18 +134,19 @@ def fetch_keywords_from_api(endpoint, params):
     }
 
     try:
-        response = requests.get(url, headers=headers, params=params)
+        # Streamed so rows are parsed and compacted as the body arrives
+        response = requests.get(url, headers=headers, params=params, stream=True)
         
         # Log response body on error
         if response.status_code == 429:
             print(f"⚠️ Rate limited (429) on {endpoint} for params {params}")
             print(f"🔁 Headers: {response.headers}")
-            raise requests.exceptions.RequestException("Rate limit hit (429)")
+            raise RateLimitError("Rate limit hit (429)")
 
         response.raise_for_status()
 
-        data = response.json()
-        return data if isinstance(data, list) else [data]
+        response.encoding = response.encoding or "utf-8"
+        return list(compact_rows(iter_json_array(response.iter_content(READ_SIZE, decode_unicode=True))))
 
     except requests.exceptions.RequestException as e:
         print(f"❌ Error fetching {endpoint} with params {params}: {e}")
@@ -60,31 +158,51 @@ def fetch_keywords_from_api(endpoint, params):
 
 
 
-def calculate_similarity_batch(seed_keywords, texts):
-    seed_embeddings = model.encode(seed_keywords, convert_to_tensor=True)
-    text_embeddings = model.encode(texts, convert_to_tensor=True)
-    return util.cos_sim(seed_embeddings, text_embeddings).max(dim=0).values.cpu().tolist()
+def get_embedding_cache():
+    global embedding_cache
+    if embedding_cache is None:
+        embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR, embedding_backend.cache_name)
+    return embedding_cache
+
 
+def encode_uncached(texts):
+    # Only de-duplicated cache misses reach the model, so this times real encoding work
+    increment("embedding_texts_encoded_total", len(texts), backend=embedding_backend.cache_name)
+    start_time = time.perf_counter()
+    with span("embedding_batch", backend=embedding_backend.cache_name):
+        embeddings = embedding_backend.encode(texts)
+    seconds = time.perf_counter() - start_time
+    if texts and seconds > 0:
+        rate = len(texts) / seconds
+        set_gauge("embedding_texts_per_second", rate, backend=embedding_backend.cache_name)
+        print(f"Encoded {len(texts)} texts in {seconds:.2f}s ({rate:.0f} texts/sec, "
+              f"batch size {EMBEDDING_BATCH_SIZE}).")
+    return embeddings
 
-def adjust_score_for_repetition(keywords):
-    keyword_texts = [kw["text"].lower() for kw in keywords]
-    repetition_counts = Counter(keyword_texts)
-    for keyword in keywords:
-        repetitions = repetition_counts[keyword["text"].lower()]
-        if repetitions > 1:
-            penalty = 0.1 * (repetitions - 1)
-            keyword["score"] -= penalty
-            keyword["score"] = max(keyword["score"], 0)
-    return keywords
+
+def embed_texts(texts):
+    increment("embedding_texts_requested_total", len(texts))
+    return get_embedding_cache().encode(texts, encode_uncached)
+
+
+def calculate_similarity_batch(seed_keywords, texts):
+    seed_embeddings = normalize_rows(embed_texts(seed_keywords))
+    text_embeddings = normalize_rows(embed_texts(texts))
+    return (seed_embeddings @ text_embeddings.T).max(axis=0).tolist()
 
 
-def cluster_keywords(keywords, num_clusters=10):
+def cluster_keywords(keywords, num_clusters=10, method=None):
     texts = [kw["text"] for kw in keywords]
-    embeddings = model.encode(texts)
-    clustering = AgglomerativeClustering(
-        n_clusters=num_clusters, metric="euclidean", linkage="ward"
+    embeddings = embed_texts(texts)
+    method = method or CLUSTERING_METHOD
+    with span("clustering", method=method):
+        cluster_labels, report = cluster_embeddings(embeddings, num_clusters, method)
+    set_gauge("clustering_peak_traced_megabytes", report["peak_traced_mb"], method=method)
+    print(
+        f"Clustered {report['keywords']} keywords into {report['clusters']} clusters with "
+        f"{report['method']} in {report['seconds']:.2f}s "
+        f"(peak traced {report['peak_traced_mb']:.1f} MB, max RSS {report['max_rss_mb']:.1f} MB)"
     )
-    cluster_labels = clustering.fit_predict(embeddings)
     clusters = {}
     for idx, label in enumerate(cluster_labels):
         clusters.setdefault(label, []).append(keywords[idx])
@@ -99,245 +217,637 @@ def select_from_clusters(clusters):
     return final_keywords
 
 
-def fetch_cached_keywords(conn):
+def parse_locales(value):
+    locales = []
+    for pair in value.split(","):
+        location, _, lang = pair.strip().partition(":")
+        if not location or not lang:
+            raise ValueError(f"Locale {pair.strip()!r} is not LOCATION:lang")
+        locales.append((location.upper(), lang.lower()))
+    return list(dict.fromkeys(locales))
+
+
+def fetch_cached_keywords(seed_keywords, locales=(DEFAULT_LOCALE,), keep=None):
+    # Freshness is tracked per seed and locale: only pairs with rows newer
+    # than the expiration window come back, everything else gets refetched.
+    # keep, if given, filters the row stream; a pair whose rows are all
+    # dropped still counts as cached.
     expiration_time = datetime.utcnow() - timedelta(hours=CACHE_EXPIRATION_HOURS)
-    with conn.cursor() as cur:
+    locales = set(locales)
+    cached = {}
+    with server_side_cursor("fetch_cached_keywords") as cur:
         cur.execute("""
-            SELECT text, volume, competition_level, trend, created_at
+            SELECT seed_keyword, category, text, volume, competition_level, trend, location, lang
             FROM raw_keywords
-            WHERE created_at >= %s
-        """, (expiration_time,))
-        return [
-            {"text": row[0], "volume": row[1],
-                "competition_level": row[2], "trend": row[3]}
-            for row in cur.fetchall()
-        ]
-
-
-def save_filtered_keywords(conn, filtered_keywords):
-    with conn.cursor() as cur:
-        values = [
-            (kw["text"], kw["similarity"], kw["score"], datetime.utcnow())
-            for kw in filtered_keywords
-        ]
-        cur.executemany("""
-            INSERT INTO filtered_keywords (text, similarity, score, created_at)
-            VALUES (%s, %s, %s, %s)
-        """, values)
-        conn.commit()
-
-def fetch_blacklist(conn, expiry_days=90):
+            WHERE created_at >= %s AND seed_keyword = ANY(%s)
+              AND location = ANY(%s) AND lang = ANY(%s)
+        """, (expiration_time, list(seed_keywords),
+              sorted({location for location, _ in locales}), sorted({lang for _, lang in locales})))
+
+        def rows():
+            for row in cur:
+                # The query matches location and lang separately, so drop unconfigured pairs here
+                if (row[6], row[7]) not in locales:
+                    continue
+                cached.setdefault((row[0], (row[6], row[7])), [])
+                yield {
+                    "seed_keyword": row[0], "category": row[1], "text": row[2],
+                    "volume": row[3], "competition_level": row[4] or "", "trend": row[5],
+                    "location": row[6], "lang": row[7],
+                }
+
+        for item in (keep(rows()) if keep else rows()):
+            cached[(item["seed_keyword"], (item["location"], item["lang"]))].append(item)
+    return cached
+
+
+def fetch_seed_priorities(days=SEED_PRIORITY_DAYS):
+    # Best score each seed's keywords reached per locale; seeds that keep
+    # producing strong keywords are fetched first
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    with transaction("fetch_seed_priorities") as cur:
+        cur.execute("""
+            SELECT seed_keyword, location, lang, MAX(score)
+            FROM filtered_keywords
+            WHERE created_at >= %s AND seed_keyword IS NOT NULL
+            GROUP BY seed_keyword, location, lang
+        """, (cutoff,))
+        return {(row[0], (row[1], row[2])): row[3] for row in cur.fetchall()}
+
+
+def save_raw_keywords(raw_keywords):
+    # raw_keywords is append-only, so COPY it in rather than INSERT
+    if not raw_keywords:
+        return
+    created_at = datetime.utcnow()
+    values = [
+        (kw.get("text") or "", kw.get("volume") or 0, kw.get("competition_level"),
+         kw.get("trend") or 0.0, kw["seed_keyword"], kw["category"], kw["location"], kw["lang"], created_at)
+        for kw in raw_keywords
+    ]
+    with transaction("save_raw_keywords") as cur:
+        copy_rows(cur, "raw_keywords", (
+            "text", "volume", "competition_level", "trend", "seed_keyword", "category",
+            "location", "lang", "created_at"
+        ), values)
+
+
+def save_filtered_keywords(filtered_keywords):
+    created_at = datetime.utcnow()
+    values = [
+        (kw["text"], kw["similarity"], kw["score"], kw.get("seed_keyword"),
+         kw.get("location"), kw.get("lang"), created_at)
+        for kw in filtered_keywords
+    ]
+    with transaction("save_filtered_keywords") as cur:
+        bulk_insert(cur, "filtered_keywords", (
+            "text", "similarity", "score", "seed_keyword", "location", "lang", "created_at"
+        ), values)
+
+def fetch_blacklist(expiry_days=90):
     expiry_cutoff = datetime.utcnow() - timedelta(days=expiry_days)
-    with conn.cursor() as cur:
+    with server_side_cursor("fetch_blacklist") as cur:
         cur.execute("""
             SELECT term FROM blacklist
             WHERE created_at >= %s
         """, (expiry_cutoff,))
-        return set(row[0].strip().lower() for row in cur.fetchall())
-
-def insert_into_blacklist(conn, keywords):
-    with conn.cursor() as cur:
-        for kw in keywords:
-            cur.execute("""
-                INSERT INTO blacklist (term, created_at)
-                VALUES (%s, %s)
-                ON CONFLICT (term) DO NOTHING
-            """, (kw.lower(), datetime.utcnow()))
-        conn.commit()
-
-def group_keywords_by_category(keywords):
-    category_buckets = defaultdict(list)
-    for kw in keywords:
-        category = kw.get("category", "uncategorized")
-        category_buckets[category].append(kw)
-    return category_buckets
-
-def select_keywords_by_category_distribution(
-    category_buckets,
-    categories,
-    per_category_limit=2,
-    total_limit=10
-):
-    final_keywords = []
-    seen_texts = set()
-
-    for cat in categories:
-        top_items = sorted(category_buckets.get(cat, []), key=lambda x: x["score"], reverse=True)[:per_category_limit]
-        for kw in top_items:
-            norm_text = kw["text"].strip().lower()
-            if norm_text not in seen_texts and len(final_keywords) < total_limit:
-                final_keywords.append(kw)
-                seen_texts.add(norm_text)
-
-    # Fallback to fill up remaining slots
-    all_keywords = [kw for bucket in category_buckets.values() for kw in bucket]
-    for kw in sorted(all_keywords, key=lambda x: x["score"], reverse=True):
-        norm_text = kw["text"].strip().lower()
-        if norm_text not in seen_texts and len(final_keywords) < total_limit:
-            final_keywords.append(kw)
-            seen_texts.add(norm_text)
-
-    return final_keywords
-
-def fetch_data_for_seed_with_backoff(seed, category, max_retries=6, base_delay=6):
+        return set(row[0].strip().lower() for row in cur)
+
+def load_blacklist_index(blacklist):
+    directory = os.path.join(EMBEDDING_CACHE_DIR, "blacklist_index", embedding_backend.cache_name)
+    index = BlacklistIndex(
+        embed_texts,
+        threshold=BLACKLIST_SIMILARITY_THRESHOLD,
+        ann_min_size=BLACKLIST_ANN_MIN_SIZE,
+        directory=directory,
+    ).load()
+    index.sync(blacklist)
+    return index
+
+
+def insert_into_blacklist(keywords):
+    created_at = datetime.utcnow()
+    # Deduplicate first: one statement can't touch the same conflict key twice
+    values = [(term, created_at) for term in dict.fromkeys(kw.lower() for kw in keywords)]
+    with transaction("insert_into_blacklist") as cur:
+        bulk_insert(cur, "blacklist", ("term", "created_at"), values,
+                    on_conflict="ON CONFLICT (term) DO NOTHING")
+
+def build_seed_requests(seed, locale=DEFAULT_LOCALE):
+    location, lang = locale
+    return [
+        ("keysuggest", {"keyword": seed, "location": location, "lang": lang}),
+        ("globalkey", {"keyword": seed, "lang": lang}),
+        ("topkeys", {"keyword": seed, "location": location, "lang": lang}),
+    ]
+
+
+def fetch_endpoint_with_backoff(limiter, endpoint, params, max_retries=6, base_delay=6, on_retry=None):
     for attempt in range(max_retries):
+        limiter.acquire()
         try:
-            print(f"\nFetching for seed: '{seed}' (attempt {attempt + 1})")
-
-            # Throttle at safe 6s spacing between requests
-            results = []
-            for endpoint, params in [
-                ("keysuggest", {"keyword": seed, "location": "GB", "lang": "en"}),
-                ("globalkey", {"keyword": seed, "lang": "en"}),
-                ("topkeys", {"keyword": seed, "location": "GB", "lang": "en"}),
-            ]:
-                result = fetch_keywords_from_api(endpoint, params)
-                results.extend(result)
-                time.sleep(base_delay)  # Safe delay between each individual request
-
-            # Tag metadata
-            for item in results:
-                item["seed_keyword"] = seed
-                item["category"] = category
-
-            print(f"✅ Got {len(results)} results for '{seed}'")
+            with span("rapidapi_request", endpoint=endpoint):
+                results = fetch_keywords_from_api(endpoint, params)
+            increment("rapidapi_keywords_total", len(results), endpoint=endpoint)
             return results
-
         except Exception as e:
-            print(f"⚠️ Error on attempt {attempt + 1} for '{seed}': {e}")
-            # Increase wait only if there's an error (exponential backoff)
-            backoff_delay = base_delay * (attempt + 1) + random.uniform(0.5, 1.5)
-            print(f"🔁 Waiting {backoff_delay:.2f}s before retrying...")
+            print(f"⚠️ Error on attempt {attempt + 1} for {endpoint} {params}: {e}")
+            if isinstance(e, RateLimitError):
+                increment("rapidapi_rate_limited_total", endpoint=endpoint)
+            # Nothing left to wait for after the last attempt
+            if attempt + 1 == max_retries:
+                break
+            increment("rapidapi_retries_total", endpoint=endpoint)
+            if on_retry:
+                on_retry()
+            # Exponential backoff for this request only; other requests keep going
+            backoff_delay = base_delay * (2 ** attempt) + random.uniform(0.5, 1.5)
+            if isinstance(e, RateLimitError):
+                limiter.pause(backoff_delay)
+            print(f"🔁 Waiting {backoff_delay:.2f}s before retrying {endpoint}...")
             time.sleep(backoff_delay)
 
-    print(f"❌ Failed all {max_retries} attempts for '{seed}'")
+    print(f"❌ Failed all {max_retries} attempts for {endpoint} {params}")
+    increment("rapidapi_failed_requests_total", endpoint=endpoint)
     return []
 
 
+def fetch_all_seeds_concurrently(
+    seed_locale_category_map,
+    limiter=None,
+    max_workers=FETCH_MAX_WORKERS,
+    on_seed_complete=None,
+    keep=None,
+    priorities=None,
+    scheduler=None
+):
+    """
+    Fetch every (seed, locale) x endpoint request as one job set. The
+    shared bucket keeps the combined rate at the plan quota, and the
+    scheduler decides which job takes the next slot: locales share the
+    quota evenly, and within a locale seeds with higher priorities (past
+    scores) go first. Identical requests, such as globalkey for two
+    locales with the same language, are sent once and fanned out.
+
+    seed_locale_category_map maps (seed, (location, lang)) to a category;
+    results come back keyed the same way. Pass a scheduler to read the
+    requests spent per locale afterwards.
+    """
+    limiter = limiter or TokenBucket(RAPIDAPI_REQUESTS_PER_SECOND)
+    priorities = priorities or {}
+    results_by_key = {key: [] for key in seed_locale_category_map}
+    pending_by_key = {key: 0 for key in seed_locale_category_map}
+
+    targets_by_request = {}
+    for key in seed_locale_category_map:
+        seed, locale = key
+        for endpoint, params in build_seed_requests(seed, locale):
+            targets_by_request.setdefault((endpoint, tuple(sorted(params.items()))), []).append(key)
+            pending_by_key[key] += 1
+
+    if scheduler is None:
+        scheduler = FairQuotaScheduler()
+    for request, targets in targets_by_request.items():
+        scheduler.add(targets[0][1], request, priorities.get(targets[0], 0.0))
+
+    def fetch_next():
+        # Jobs are taken when a worker frees up, so the order follows the scheduler, not submission
+        locale, (endpoint, params) = scheduler.next()
+        results = fetch_endpoint_with_backoff(
+            limiter, endpoint, dict(params), on_retry=lambda: scheduler.charge(locale)
+        )
+        return (endpoint, params), results
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fetch_next) for _ in range(len(scheduler))]
+
+        for future in as_completed(futures):
+            request, results = future.result()
+            endpoint = request[0]
+            for position, key in enumerate(targets_by_request[request]):
+                seed, (location, lang) = key
+                # Each target gets its own dicts, since rows are tagged per locale
+                rows = results if position == 0 else [dict(item) for item in results]
+                for item in rows:
+                    item["seed_keyword"] = seed
+                    item["category"] = seed_locale_category_map[key]
+                    item["location"] = location
+                    item["lang"] = lang
+                results_by_key[key].extend(rows)
+                print(f"✅ Got {len(rows)} results for '{seed}' ({location}/{lang}) from {endpoint}")
+
+                # Callbacks run on this thread, so seeds are persisted one at a time
+                pending_by_key[key] -= 1
+                if pending_by_key[key] == 0:
+                    if on_seed_complete:
+                        on_seed_complete(key, results_by_key[key])
+                    # Once persisted, only rows that can still become candidates are kept
+                    if keep:
+                        results_by_key[key] = list(keep(results_by_key[key]))
+
+    spent = ", ".join(f"{location}/{lang}: {count}" for (location, lang), count in scheduler.spent.items())
+    print(f"Fetched {len(futures)} requests in {time.time() - start_time:.2f} seconds ({spent}).")
+    return results_by_key
+
+
+def get_trends_client(name):
+    if name == "trendspy":
+        return TrendspyClient(TRENDS_TIMEFRAME)
+    if name == "stub":
+        return StubTrendsClient()
+    raise ValueError(f"Unknown Trends client '{name}'. Choose one of: trendspy, stub, off")
+
+
+def count_requests(phrase, locales):
+    # Requests identical across locales are sent once, as in fetch_all_seeds_concurrently
+    return len({
+        (endpoint, tuple(sorted(params.items())))
+        for locale in locales for endpoint, params in build_seed_requests(phrase, locale)
+    })
+
+
+def expand_seeds(seed_keywords, rows_by_seed, locales, blacklist, blacklist_index, keep, budget, limiter):
+    """
+    Crawl from this run's best results within a request budget and return
+    the new rows grouped under the configured seed each chain started from.
+    Every round draws on the run's token bucket, so the crawl shares the
+    plan quota with the main fetch.
+    """
+    root_by_phrase = {seed: seed for seed in seed_keywords}
+
+    def score_rows(rows):
+        if not rows:
+            return []
+        table = filter_candidates(build_candidate_table(rows), blacklist,
+                                  category_minimum=len(rows), near_duplicate_fn=blacklist_index.matches)
+        if table.empty:
+            return []
+        scored = score_candidates(table, calculate_similarity_batch(seed_keywords, table["text"].tolist()))
+        return [
+            (text, score, (root_by_phrase[rows[row]["seed_keyword"]], category))
+            for text, score, category, row in zip(scored["text"], scored["score"], scored["category"], scored["row"])
+        ]
+
+    expansion_rows = defaultdict(list)
+
+    def fetch_batch(batch):
+        for phrase, (root, _) in batch:
+            root_by_phrase.setdefault(phrase, root)
+        # A phrase crawled in the last 24h is served from raw_keywords for free
+        cached = fetch_cached_keywords([phrase for phrase, _ in batch], locales, keep=keep)
+        stale_map = {
+            (phrase, locale): category
+            for phrase, (_, category) in batch for locale in locales if (phrase, locale) not in cached
+        }
+        scheduler = FairQuotaScheduler()
+        results = {}
+        if stale_map:
+            results = fetch_all_seeds_concurrently(
+                stale_map,
+                limiter=limiter,
+                on_seed_complete=lambda key, rows: save_raw_keywords(rows),
+                keep=keep,
+                scheduler=scheduler,
+            )
+        rows = [row for pairs in (cached, results) for pair_rows in pairs.values() for row in pair_rows]
+        for row in rows:
+            expansion_rows[root_by_phrase[row["seed_keyword"]]].append(row)
+        return rows, sum(scheduler.spent.values())
+
+    crawler = SeedExpansionCrawler(
+        embed_texts,
+        lambda texts: np.isin(texts, list(blacklist)) | blacklist_index.matches(texts),
+        budget,
+        novelty_weight=EXPANSION_NOVELTY_WEIGHT,
+        batch_size=FETCH_MAX_WORKERS,
+    )
+    crawler.mark_explored(seed_keywords)
+    explored_seeds = len(crawler.explored)
+    crawler.offer(score_rows([row for seed in seed_keywords for row in rows_by_seed[seed]]))
+    rounds = crawler.crawl(fetch_batch, score_rows, lambda phrase: count_requests(phrase, locales))
+
+    expanded = len(crawler.explored) - explored_seeds
+    set_gauge("seed_expansion_requests", crawler.spent)
+    set_gauge("keywords", sum(len(rows) for rows in expansion_rows.values()), step="expanded")
+    print(f"Expanded {expanded} frontier seeds in {rounds} rounds, "
+          f"{crawler.spent} of {budget} requests spent, {len(crawler.frontier)} left in the frontier.")
+    return expansion_rows
+
+
+def fetch_seed_keywords():
+    with transaction("fetch_seed_keywords") as cur:
+        cur.execute("SELECT keyword, category FROM seed_keywords")
+        seed_rows = cur.fetchall()
+    return {row[0].strip().lower(): row[1] or "uncategorized" for row in seed_rows}
+
+
 def fetch_and_analyze_keywords():
-    conn = psycopg2.connect(DB_CONNECTION_STRING)
+    # Every query below borrows a pooled connection for just as long as it needs one
+    get_pool(DB_CONNECTION_STRING)
     try:
-        # Fetch existing blacklist
-        blacklist = fetch_blacklist(conn)
+        analyze_keywords()
+    finally:
+        embedding_backend.close()
+        close_pool()
+
+
+def analyze_keywords(limiter=None):
+    """
+    One full keyword run on an open pool. Seed/locale pairs fetched in the
+    last 24h (e.g. by queued fetch jobs) come from raw_keywords; only the
+    rest are fetched here. Every RapidAPI request of the run goes through
+    limiter, one token bucket created here when not given.
+    """
+    limiter = limiter or TokenBucket(RAPIDAPI_REQUESTS_PER_SECOND)
+    # Fetch existing blacklist and bring the semantic index up to date with it
+    with span("pipeline_stage", stage="blacklist"):
+        blacklist = fetch_blacklist()
+        blacklist_index = load_blacklist_index(blacklist)
+
+    seed_keyword_category_map = fetch_seed_keywords()
+    seed_keywords = list(seed_keyword_category_map.keys())
+    locales = parse_locales(KEYWORD_LOCALES)
+
+    # Rows failing the row-wise filter rules are dropped while streaming in
+    keep = lambda rows: prefilter_rows(rows, blacklist)
+    cached = fetch_cached_keywords(seed_keywords, locales, keep=keep)
+    stale_map = {
+        (seed, locale): category
+        for seed, category in seed_keyword_category_map.items() for locale in locales
+        if (seed, locale) not in cached
+    }
+    if cached:
+        print(f"Using cached keywords for {len(cached)} seed/locale pairs...")
+
+    results = {}
+    if stale_map:
+        print(f"Fetching data concurrently for {len(stale_map)} stale seed/locale pairs "
+              f"across {len(locales)} locales...")
+        # Persist each pair as soon as it completes so a crashed run keeps its progress
+        with span("pipeline_stage", stage="fetch"):
+            results = fetch_all_seeds_concurrently(
+                stale_map,
+                limiter=limiter,
+                on_seed_complete=lambda key, rows: save_raw_keywords(rows),
+                keep=keep,
+                priorities=fetch_seed_priorities(),
+            )
+
+    # Locales are pooled per seed, in configured order, for the rest of the run
+    rows_by_seed = {
+        seed: [
+            row for locale in locales
+            for row in cached.get((seed, locale)) or results.get((seed, locale), [])
+        ]
+        for seed in seed_keywords
+    }
 
-        cached_keywords = fetch_cached_keywords(conn)
-        if cached_keywords:
-            print("Using cached keywords...")
-            combined_data = cached_keywords
+    # Rows found by expansion count towards the seed their crawl started from
+    expanded_seeds = set()
+    if KEYWORD_EXPANSION_BUDGET > 0:
+        with span("pipeline_stage", stage="expand"):
+            expansion_rows = expand_seeds(
+                seed_keywords, rows_by_seed, locales, blacklist, blacklist_index, keep,
+                KEYWORD_EXPANSION_BUDGET, limiter,
+            )
+        for seed, rows in expansion_rows.items():
+            rows_by_seed[seed].extend(rows)
+            expanded_seeds.add(seed)
+
+    incremental_state = None
+    if KEYWORD_INCREMENTAL:
+        incremental_state = IncrementalState(seed_keywords, locales).load()
+        incremental_state.find_changed_seeds(
+            {seed for seed, _ in cached}, {seed for seed, _ in stale_map} | expanded_seeds
+        )
+        with span("pipeline_stage", stage="filter"):
+            filtered, combined_data = incremental_state.build(
+                rows_by_seed, blacklist, blacklist_index.matches,
+                lambda texts: calculate_similarity_batch(seed_keywords, texts),
+            )
+        set_gauge("keywords", sum(len(rows_by_seed[seed]) for seed in incremental_state.changed), step="raw")
+        set_gauge("keywords", len(filtered), step="filtered")
+        print(f"{len(filtered)} keywords passed initial filters.")
+    else:
+        combined_data = [item for seed in seed_keywords for item in rows_by_seed[seed]]
+
+        # Filter out blacklisted terms and weak candidates in one vectorized pass
+        with span("pipeline_stage", stage="filter"):
+            candidates = build_candidate_table(combined_data)
+            filtered = filter_candidates(candidates, blacklist, near_duplicate_fn=blacklist_index.matches)
+        set_gauge("keywords", len(combined_data), step="raw")
+        set_gauge("keywords", len(filtered), step="filtered")
+
+        print(f"{len(filtered)} keywords passed initial filters.")
+        print(f"{len(candidates) - len(filtered)} keywords ignored due to blacklist or filter failure.")
+
+    if filtered.empty:
+        print("No keywords passed the filters.")
+        if incremental_state is not None:
+            incremental_state.save()
+        return
+
+    print("Keyword category distribution (pre-score):")
+    print(Counter(filtered["category"]))
+
+    print("\nSeeds and their categories:")
+    for seed, cat in seed_keyword_category_map.items():
+        print(f"{cat.ljust(12)} | {seed}")
+
+    print("Starting semantic similarity analysis...")
+    with span("pipeline_stage", stage="score"):
+        if incremental_state is not None:
+            similarities = filtered["similarity"].to_numpy()
         else:
-            combined_data = []
-            print("Fetching data concurrently for all seed keywords...")
-            with conn.cursor() as cur:
-                cur.execute("SELECT keyword, category FROM seed_keywords")
-                seed_rows = cur.fetchall()
-            
-            seed_keyword_category_map = {row[0].strip().lower(): row[1] for row in seed_rows}
-            seed_keywords = list(seed_keyword_category_map.keys())
-
-            conn.close()
-            
-            combined_data_lists = []
-            
-            for seed in seed_keywords:
-                category = seed_keyword_category_map.get(seed.lower(), "uncategorized")
-                results = fetch_data_for_seed_with_backoff(seed, category)
-                combined_data_lists.append(results)
-
-                combined_data = [
-                    item for sublist in combined_data_lists for item in sublist]
-
-        # Filter out blacklisted terms
-        pre_filter_count = len(combined_data)
-        
-        filtered_data = []
-        skipped_blacklisted = []
-        
-        filtered_by_category = defaultdict(list)
-        CATEGORY_MINIMUM = 15  # How many from each category you *try* to keep
-        
-        for item in combined_data:
-            text = item.get("text", "").strip().lower()
-            category = item.get("category", "uncategorized")
-        
-            if text in blacklist:
-                continue
-        
-            # Loosen filtering for underrepresented categories
-            volume_threshold = 50 if category in ["ai_ethics", "engineering", "crossover"] else 100
-            competition_ok = item.get("competition_level", "").lower() in ["low", "medium"]
-            trend_ok = item.get("trend", 0) >= 0
-            phrase_ok = len(text.split()) >= 2
-        
-            if (
-                item.get("volume", 0) > volume_threshold and
-                competition_ok and
-                trend_ok and
-                phrase_ok
-            ):
-                filtered_by_category[category].append(item)
-        
-        # Flatten into final list
-        filtered_data = []
-        for cat_items in filtered_by_category.values():
-            filtered_data.extend(cat_items[:CATEGORY_MINIMUM])
-
-        print(f"{len(filtered_data)} keywords passed initial filters.")
-
-        if skipped_blacklisted:
-            print(f"{pre_filter_count - len(filtered_data)} keywords ignored due to blacklist or filter failure.")
-            print(f"Skipped {len(skipped_blacklisted)} blacklisted keywords:")
-            for kw in skipped_blacklisted:
-                print(f' - "{kw}"')
-            else:
-                print("No keywords were skipped due to blacklist.")
-
-        if not filtered_data:
-            print("No keywords passed the filters.")
-            return
-
-        from collections import Counter
-        print("Keyword category distribution (pre-score):")
-        print(Counter([k['category'] for k in filtered_data]))
-
-        print("\nSeeds and their categories:")
-        for seed, cat in seed_keyword_category_map.items():
-            print(f"{cat.ljust(12)} | {seed}")
-
-        texts = [item["text"] for item in filtered_data]
-        print("Starting semantic similarity analysis...")
-        similarities = calculate_similarity_batch(seed_keywords, texts)
-
-        max_volume = max(item["volume"] for item in filtered_data)
-        for item, similarity in zip(filtered_data, similarities):
-            item["similarity"] = similarity
-            item["score"] = 0.5 * similarity + 0.4 * item["trend"] + 0.1 * (item["volume"] / max_volume)
-
-        sorted_keywords = sorted(filtered_data, key=lambda x: x["score"], reverse=True)
-        sorted_keywords = adjust_score_for_repetition(sorted_keywords)
-
-        # Step 1: Group keywords by category
-        category_buckets = group_keywords_by_category(sorted_keywords)
-        
-        # Step 2: Select top 10, balanced by your seed-defined categories
-        CATEGORIES = ["lifestyle", "ai_ethics", "engineering", "gaming", "crossover"]
-        final_keywords = select_keywords_by_category_distribution(category_buckets, CATEGORIES)
+            similarities = calculate_similarity_batch(seed_keywords, filtered["text"].tolist())
+        scored = score_candidates(filtered, similarities)
+
+    if TRENDS_ENRICHMENT != "off":
+        # Only the shortlist is looked up; series within the TTL come from the local cache
+        with span("pipeline_stage", stage="trends"):
+            scored = enrich_with_trends(
+                scored,
+                get_trends_client(TRENDS_ENRICHMENT),
+                TrendsCache(os.path.join(TRENDS_CACHE_DIR, TRENDS_TIMEFRAME.replace(" ", "_")),
+                            TRENDS_CACHE_TTL_HOURS * 3600),
+                shortlist=TRENDS_SHORTLIST,
+                weight=TRENDS_WEIGHT,
+                requests_per_second=TRENDS_REQUESTS_PER_SECOND,
+                max_workers=TRENDS_MAX_WORKERS,
+            )
+
+    # Select top 10, balanced by your seed-defined categories
+    with span("pipeline_stage", stage="select"):
+        if SELECTION_METHOD == "mmr":
+            # Same texts as the scoring step, so these come from the embedding cache
+            embeddings = normalize_rows(embed_texts(scored["text"].tolist()))
+            positions = select_mmr(scored, embeddings, CATEGORIES, diversity=MMR_DIVERSITY)
+        else:
+            positions = select_by_category_distribution(scored, CATEGORIES)
+        final_keywords = materialize(scored, combined_data, positions)
+    set_gauge("keywords", len(final_keywords), step="selected")
+
+    # Add selected keywords to the blacklist
+    blacklisted_now = [kw["text"].strip().lower() for kw in final_keywords]
+    for kw in blacklisted_now:
+        print(f"Blacklisting keyword: '{kw}'")
+    with span("pipeline_stage", stage="persist"):
+        save_filtered_keywords(final_keywords)
+        insert_into_blacklist(blacklisted_now)
+        if incremental_state is not None:
+            incremental_state.save()
+        blacklist_index.add(blacklisted_now)
+        blacklist_index.save()
+    print(f"{len(blacklisted_now)} new keywords added to blacklist.")
+
+    print(f"Saving results to {OUTPUT_FILE}...")
+    with open(OUTPUT_FILE, "w") as f:
+        json.dump(final_keywords[:10], f, indent=2)
+
+
+def enqueue_keyword_run():
+    # Cheap enough for the scheduled job: no model, no fetching, just rows on keyword_jobs
+    get_pool(DB_CONNECTION_STRING)
+    try:
+        locales = parse_locales(KEYWORD_LOCALES)
+        jobs = {
+            (seed, locale): category
+            for seed, category in fetch_seed_keywords().items() for locale in locales
+        }
+        queue = KeywordJobQueue(worker_id=socket.gethostname())
+        run_id = queue.enqueue_run(jobs, fetch_seed_priorities())
+        if run_id is None:
+            print("A keyword run is still queued or in progress; not enqueuing another.")
+        else:
+            print(f"Queued keyword run {run_id}: {len(jobs)} fetch jobs and an analyze job.")
+    finally:
+        close_pool()
+
 
-        conn = psycopg2.connect(DB_CONNECTION_STRING)
-        save_filtered_keywords(conn, final_keywords)
+class LeaseKeeper:
+    """
+    Renews the leases of the jobs a worker holds from a background thread,
+    so a long analysis is not handed to another worker half-way.
+    """
 
-        # Add selected keywords to the blacklist
-        blacklisted_now = [kw["text"].strip().lower() for kw in final_keywords]
-        for kw in blacklisted_now:
-            print(f"Blacklisting keyword: '{kw}'")
-        insert_into_blacklist(conn, blacklisted_now)
-        print(f"{len(blacklisted_now)} new keywords added to blacklist.")
+    def __init__(self, queue, job_ids, interval):
+        self.queue = queue
+        self.job_ids = list(job_ids)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
 
-        print(f"Saving results to {OUTPUT_FILE}...")
-        with open(OUTPUT_FILE, "w") as f:
-            json.dump(final_keywords[:10], f, indent=2)
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.queue.renew(self.job_ids)
+            except Exception as e:
+                print(f"⚠️ Could not renew job leases: {e}")
 
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_fetch_jobs(queue, jobs, limiter):
+    # Each job is marked done as soon as its rows are in raw_keywords
+    job_ids = {(job["seed_keyword"], (job["location"], job["lang"])): job["id"] for job in jobs}
+    done = []
+
+    def persist(key, rows):
+        save_raw_keywords(rows)
+        queue.complete([job_ids[key]])
+        done.append(job_ids[key])
+
+    try:
+        with LeaseKeeper(queue, job_ids.values(), KEYWORD_JOB_LEASE_SECONDS / 3):
+            fetch_all_seeds_concurrently(
+                {key: job["category"] for key, job in zip(job_ids, jobs)},
+                limiter=limiter,
+                on_seed_complete=persist,
+            )
+    except Exception as e:
+        queue.fail([job_id for job_id in job_ids.values() if job_id not in done], e)
+        raise
+
+
+def run_analyze_job(queue, job, limiter):
+    try:
+        with LeaseKeeper(queue, [job["id"]], KEYWORD_JOB_LEASE_SECONDS / 3):
+            analyze_keywords(limiter)
+    except Exception as e:
+        queue.fail([job["id"]], e)
+        raise
+    queue.complete([job["id"]])
+
+
+def run_reported_job(pipeline, run_id, job_fn):
+    # Each job starts from an empty registry and writes its own report,
+    # so a resident worker neither grows its metrics nor reports running totals
+    metrics.reset()
+    try:
+        job_fn()
+    except Exception:
+        increment("keyword_jobs_failed_total")
+        raise
     finally:
-        conn.close()
+        write_run_report(pipeline, extra={"mode": "worker", "run_id": run_id})
+
+
+def run_worker():
+    """
+    Resident worker: the model, embedding cache and DB pool are loaded once
+    and reused for every job. Fetch jobs are claimed FETCH_MAX_WORKERS at a
+    time, and they and any refetch an analyze job needs share one token
+    bucket; RAPIDAPI_REQUESTS_PER_SECOND is per worker, so split the plan
+    quota across hosts.
+    """
+    get_pool(DB_CONNECTION_STRING)
+    queue = KeywordJobQueue(
+        f"{socket.gethostname()}-{os.getpid()}",
+        lease_seconds=KEYWORD_JOB_LEASE_SECONDS,
+        max_attempts=KEYWORD_JOB_MAX_ATTEMPTS,
+    )
+    limiter = TokenBucket(RAPIDAPI_REQUESTS_PER_SECOND)
+    print(f"Keyword worker {queue.worker_id} started.")
+    try:
+        while True:
+            requeued = queue.requeue_expired()
+            if requeued:
+                print(f"Requeued {requeued} jobs with expired leases.")
+
+            try:
+                jobs = queue.claim_fetch_jobs(FETCH_MAX_WORKERS)
+                if jobs:
+                    print(f"Claimed {len(jobs)} fetch jobs.")
+                    run_reported_job("keyword_fetch_jobs", jobs[0]["run_id"],
+                                     lambda: run_fetch_jobs(queue, jobs, limiter))
+                    continue
+
+                job = queue.claim_analyze_job()
+                if job:
+                    print(f"Claimed the analyze job of run {job['run_id']}.")
+                    run_reported_job("keyword_generator", job["run_id"],
+                                     lambda: run_analyze_job(queue, job, limiter))
+                    continue
+            except Exception as e:
+                # The failed jobs are back on the queue or parked; the worker keeps going
+                print(f"❌ Job failed: {e}")
+                continue
+
+            if KEYWORD_WORKER_POLL_SECONDS <= 0:
+                print("Queue is empty; worker exiting.")
+                return
+            time.sleep(KEYWORD_WORKER_POLL_SECONDS)
+    finally:
+        embedding_backend.close()
+        close_pool()
+
 
 def load_env_from_dotenv():
     # Define the path to the secrets file
@@ -362,4 +872,14 @@ if __name__ == "__main__":
         raise EnvironmentError(
             "One or more required environment variables are missing!")
 
-    fetch_and_analyze_keywords()
+    try:
+        if KEYWORD_MODE == "enqueue":
+            enqueue_keyword_run()
+        elif KEYWORD_MODE == "worker":
+            run_worker()
+        else:
+            fetch_and_analyze_keywords()
+    finally:
+        # Workers report each job as it finishes
+        if KEYWORD_MODE != "worker":
+            write_run_report("keyword_generator", extra={"mode": KEYWORD_MODE})
@@ -0,0 +1,197 @@
+import hashlib
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from candidate_table import CATEGORY_MINIMUM, build_candidate_table, cap_per_category, filter_candidates
+from db_access import bulk_insert, server_side_cursor, transaction
+
+STATE_COLUMNS = (
+    "seed_keyword", "seed_rank", "text", "category", "competition_level", "volume", "trend", "similarity",
+    "location", "lang",
+)
+# What the selected keywords carry into save_filtered_keywords and keywords.json
+ROW_COLUMNS = ("text", "volume", "competition_level", "trend", "seed_keyword", "category", "location", "lang")
+
+
+def seeds_fingerprint(seed_keywords, locales=()):
+    # Similarity is the max over every seed, so stored values only hold for the same seed set;
+    # the locale set decides which raw rows a seed's candidates were drawn from
+    key = [sorted(seed_keywords), sorted(list(locale) for locale in locales)]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()[:16]
+
+
+class IncrementalState:
+    """
+    Carries the filtered candidates of each seed and their seed similarity
+    between runs (keyword_candidates), plus a per-seed watermark of the
+    newest raw_keywords row already folded in (keyword_watermarks).
+
+    Only seeds whose raw rows moved past their watermark are filtered and
+    embedded again; every other seed reuses its stored candidates, which
+    are just re-checked against the current blacklist. Scoring, the
+    per-category cap and selection still run over the whole merged table,
+    since volume normalization and the repetition penalty depend on all
+    candidates at once.
+    """
+
+    def __init__(self, seed_keywords, locales=()):
+        self.seed_keywords = list(seed_keywords)
+        self.seeds_hash = seeds_fingerprint(self.seed_keywords, locales)
+        self.watermarks = {}
+        self.state = pd.DataFrame(columns=STATE_COLUMNS)
+        self.changed = {}
+        self.delta = pd.DataFrame(columns=STATE_COLUMNS)
+        self.stale = pd.DataFrame(columns=STATE_COLUMNS)
+
+    def load(self):
+        with transaction("load_keyword_watermarks") as cur:
+            cur.execute("SELECT seed_keyword, processed_through, seeds_hash FROM keyword_watermarks")
+            self.watermarks = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+        with server_side_cursor("load_keyword_candidates") as cur:
+            cur.execute(f"""
+                SELECT {", ".join(STATE_COLUMNS)}
+                FROM keyword_candidates
+                WHERE seeds_hash = %s AND seed_keyword = ANY(%s)
+            """, (self.seeds_hash, self.seed_keywords))
+            rows = list(cur)
+        self.state = pd.DataFrame(rows, columns=STATE_COLUMNS)
+        self.state["volume"] = self.state["volume"].fillna(0).astype(np.float64)
+        self.state["trend"] = self.state["trend"].fillna(0.0).astype(np.float64)
+        self.state["competition_level"] = self.state["competition_level"].fillna("")
+        self.state["norm_text"] = self.state["text"].str.strip().str.lower()
+        return self
+
+    def find_changed_seeds(self, cached_seeds, fresh_seeds):
+        # A seed is reprocessed when any of its locales was just fetched, its cached
+        # rows are newer than its watermark, or its watermark was taken with a
+        # different seed set
+        latest = self._latest_raw_rows([seed for seed in self.seed_keywords if seed in cached_seeds])
+        now = datetime.utcnow()
+        self.changed = {}
+        for seed in self.seed_keywords:
+            watermark = self.watermarks.get(seed)
+            if seed in fresh_seeds:
+                self.changed[seed] = now
+            elif watermark is None or watermark[1] != self.seeds_hash:
+                self.changed[seed] = latest.get(seed, now)
+            elif seed in latest and latest[seed] > watermark[0]:
+                self.changed[seed] = latest[seed]
+        return self.changed
+
+    def _latest_raw_rows(self, seeds):
+        if not seeds:
+            return {}
+        with transaction("latest_raw_keywords") as cur:
+            cur.execute("""
+                SELECT seed_keyword, MAX(created_at)
+                FROM raw_keywords
+                WHERE seed_keyword = ANY(%s)
+                GROUP BY seed_keyword
+            """, (seeds,))
+            return dict(cur.fetchall())
+
+    def build(self, rows_by_seed, blacklist, near_duplicate_fn, similarity_fn):
+        """
+        Returns the merged candidate table with a similarity column, in the
+        same order and with the same cap as the full run, plus the row
+        dicts its "row" column points at.
+        """
+        delta_rows, seeds, ranks = [], [], []
+        for seed in self.seed_keywords:
+            if seed not in self.changed:
+                continue
+            for rank, row in enumerate(rows_by_seed.get(seed, [])):
+                delta_rows.append(row)
+                seeds.append(seed)
+                ranks.append(rank)
+
+        # New rows get the rule and near-duplicate checks, uncapped so the
+        # cap can be applied once over new and carried-over candidates together
+        table = build_candidate_table(delta_rows)
+        table["seed_keyword"] = pd.Series(seeds, dtype=object)
+        table["seed_rank"] = np.asarray(ranks, dtype=np.int64)
+        table["location"] = pd.Series([row.get("location") for row in delta_rows], dtype=object)
+        table["lang"] = pd.Series([row.get("lang") for row in delta_rows], dtype=object)
+        delta = filter_candidates(table, blacklist, category_minimum=max(len(table), 1),
+                                  near_duplicate_fn=near_duplicate_fn)
+        delta["similarity"] = self._similarities(delta, similarity_fn)
+        self.delta = delta
+
+        # Carried-over candidates only need checking against the blacklist as it is now
+        carried = self.state[~self.state["seed_keyword"].isin(list(self.changed))]
+        stale = carried["norm_text"].isin(list(blacklist)).to_numpy()
+        if near_duplicate_fn is not None and not carried.empty:
+            stale = stale | np.asarray(near_duplicate_fn(carried["text"].tolist()), dtype=bool)
+        self.stale = carried[stale]
+        carried = carried[~stale]
+        print(
+            f"Incremental run: {len(self.changed)} of {len(self.seed_keywords)} seeds changed, "
+            f"{len(delta_rows)} new raw rows, {len(delta)} new candidates, "
+            f"{len(carried)} carried over, {len(self.stale)} dropped as newly blacklisted."
+        )
+
+        merged = pd.concat([carried, delta[list(STATE_COLUMNS) + ["norm_text"]]], ignore_index=True)
+        seed_position = {seed: position for position, seed in enumerate(self.seed_keywords)}
+        order = np.lexsort((
+            merged["seed_rank"].to_numpy(dtype=np.int64),
+            merged["seed_keyword"].map(seed_position).to_numpy(dtype=np.int64),
+        ))
+        merged = cap_per_category(merged.iloc[order].reset_index(drop=True), CATEGORY_MINIMUM)
+        merged["row"] = np.arange(len(merged))
+
+        rows = merged[list(ROW_COLUMNS)].to_dict("records")
+        for row in rows:
+            row["volume"] = int(row["volume"])
+        return merged, rows
+
+    def _similarities(self, delta, similarity_fn):
+        # Keywords come back from every refetch of a seed, so most already have a similarity
+        known = dict(zip(self.state["norm_text"], self.state["similarity"]))
+        missing = list(dict.fromkeys(
+            text for text, norm in zip(delta["text"], delta["norm_text"]) if norm not in known
+        ))
+        if missing:
+            for text, similarity in zip(missing, similarity_fn(missing)):
+                known.setdefault(text.strip().lower(), similarity)
+        print(f"Computed similarity for {len(missing)} keywords, reused {len(delta) - len(missing)}.")
+        return np.array([known[norm] for norm in delta["norm_text"]], dtype=np.float64)
+
+    def save(self):
+        # Replace the candidates of every reprocessed seed and move its watermark forward
+        now = datetime.utcnow()
+        changed = list(self.changed)
+        candidates = [
+            (row.seed_keyword, int(row.seed_rank), row.text, row.category, row.competition_level or None,
+             int(row.volume), float(row.trend), float(row.similarity), row.location, row.lang,
+             self.seeds_hash, now)
+            for row in self.delta.itertuples(index=False)
+        ]
+        with transaction("save_keyword_state") as cur:
+            cur.execute("""
+                DELETE FROM keyword_candidates
+                WHERE seed_keyword = ANY(%s) OR seeds_hash <> %s OR NOT (seed_keyword = ANY(%s))
+            """, (changed, self.seeds_hash, self.seed_keywords))
+            if not self.stale.empty:
+                cur.execute("""
+                    DELETE FROM keyword_candidates c
+                    USING unnest(%s::text[], %s::int[]) AS s(seed_keyword, seed_rank)
+                    WHERE c.seed_keyword = s.seed_keyword AND c.seed_rank = s.seed_rank
+                """, (self.stale["seed_keyword"].tolist(), [int(rank) for rank in self.stale["seed_rank"]]))
+            bulk_insert(cur, "keyword_candidates", (
+                "seed_keyword", "seed_rank", "text", "category", "competition_level",
+                "volume", "trend", "similarity", "location", "lang", "seeds_hash", "updated_at",
+            ), candidates)
+
+            cur.execute("DELETE FROM keyword_watermarks WHERE NOT (seed_keyword = ANY(%s))", (self.seed_keywords,))
+            bulk_insert(cur, "keyword_watermarks", (
+                "seed_keyword", "processed_through", "seeds_hash", "updated_at",
+            ), [(seed, processed_through, self.seeds_hash, now) for seed, processed_through in self.changed.items()],
+                on_conflict="""ON CONFLICT (seed_keyword) DO UPDATE SET
+                    processed_through = EXCLUDED.processed_through,
+                    seeds_hash = EXCLUDED.seeds_hash,
+                    updated_at = EXCLUDED.updated_at""")
+        print(f"Saved {len(candidates)} candidates for {len(changed)} seeds to the incremental state.")
@@ -0,0 +1,136 @@
+import uuid
+from datetime import datetime, timedelta
+
+from db_access import bulk_insert, transaction
+
+JOB_COLUMNS = ("id", "run_id", "kind", "seed_keyword", "category", "location", "lang")
+
+
+class KeywordJobQueue:
+    """
+    Postgres-backed queue (keyword_jobs) shared by resident keyword workers.
+
+    A run is one fetch job per seed and locale plus one analyze job. Jobs
+    are claimed with FOR UPDATE SKIP LOCKED, so workers on any number of
+    hosts take disjoint jobs without coordinating. The analyze job only
+    becomes claimable once every fetch job of its run has finished. A
+    claim is a lease: jobs whose worker stops renewing them go back to
+    pending, and a job that keeps failing is parked as failed after
+    max_attempts.
+    """
+
+    def __init__(self, worker_id, lease_seconds=900, max_attempts=3):
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def enqueue_run(self, seed_locale_category_map, priorities=None):
+        """
+        Queue a run unless one is still unfinished. Returns the run id, or
+        None when a run was already queued.
+        """
+        priorities = priorities or {}
+        # Rank seeds within each locale, so claiming by position takes locales in turn
+        ranked = {}
+        for key in seed_locale_category_map:
+            ranked.setdefault(key[1], []).append(key)
+        position = {}
+        for keys in ranked.values():
+            keys.sort(key=lambda key: -priorities.get(key, 0.0))
+            position.update({key: rank for rank, key in enumerate(keys)})
+
+        run_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+        with transaction("enqueue_keyword_run") as cur:
+            # Serializes concurrent enqueues, so two schedulers can't both see an empty queue
+            cur.execute("LOCK TABLE keyword_jobs IN SHARE ROW EXCLUSIVE MODE")
+            cur.execute("SELECT 1 FROM keyword_jobs WHERE status IN ('pending', 'running') LIMIT 1")
+            if cur.fetchone():
+                return None
+            values = [
+                (run_id, "fetch", seed, category, location, lang, position[(seed, (location, lang))],
+                 float(priorities.get((seed, (location, lang)), 0.0)), now)
+                for (seed, (location, lang)), category in seed_locale_category_map.items()
+            ]
+            values.append((run_id, "analyze", None, None, None, None, 0, 0.0, now))
+            bulk_insert(cur, "keyword_jobs", (
+                "run_id", "kind", "seed_keyword", "category", "location", "lang", "position", "priority", "created_at",
+            ), values)
+        return run_id
+
+    def claim_fetch_jobs(self, limit):
+        return self._claim("""
+            SELECT id FROM keyword_jobs
+            WHERE kind = 'fetch' AND status = 'pending'
+            ORDER BY position, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (limit,))
+
+    def claim_analyze_job(self):
+        jobs = self._claim("""
+            SELECT j.id FROM keyword_jobs j
+            WHERE j.kind = 'analyze' AND j.status = 'pending'
+              AND NOT EXISTS (
+                  SELECT 1 FROM keyword_jobs f
+                  WHERE f.run_id = j.run_id AND f.kind = 'fetch' AND f.status IN ('pending', 'running')
+              )
+            ORDER BY j.id
+            LIMIT 1
+            FOR UPDATE OF j SKIP LOCKED
+        """, ())
+        return jobs[0] if jobs else None
+
+    def _claim(self, select_sql, params):
+        with transaction("claim_keyword_jobs") as cur:
+            cur.execute(f"""
+                UPDATE keyword_jobs
+                SET status = 'running', claimed_by = %s, claimed_at = %s, attempts = attempts + 1
+                WHERE id IN ({select_sql})
+                RETURNING {", ".join(JOB_COLUMNS)}
+            """, (self.worker_id, datetime.utcnow()) + tuple(params))
+            return [dict(zip(JOB_COLUMNS, row)) for row in cur.fetchall()]
+
+    def renew(self, job_ids):
+        # Long fetches and analyses push their lease forward so they aren't reclaimed mid-way
+        if not job_ids:
+            return
+        with transaction("renew_keyword_jobs") as cur:
+            cur.execute("""
+                UPDATE keyword_jobs SET claimed_at = %s
+                WHERE id = ANY(%s) AND status = 'running' AND claimed_by = %s
+            """, (datetime.utcnow(), list(job_ids), self.worker_id))
+
+    def complete(self, job_ids):
+        if not job_ids:
+            return
+        with transaction("complete_keyword_jobs") as cur:
+            cur.execute("""
+                UPDATE keyword_jobs SET status = 'done', finished_at = %s, error = NULL
+                WHERE id = ANY(%s) AND claimed_by = %s
+            """, (datetime.utcnow(), list(job_ids), self.worker_id))
+
+    def fail(self, job_ids, error):
+        if not job_ids:
+            return
+        with transaction("fail_keyword_jobs") as cur:
+            cur.execute("""
+                UPDATE keyword_jobs
+                SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                    finished_at = CASE WHEN attempts >= %s THEN %s END,
+                    claimed_by = NULL, error = %s
+                WHERE id = ANY(%s) AND claimed_by = %s
+            """, (self.max_attempts, self.max_attempts, datetime.utcnow(), str(error)[:2000],
+                  list(job_ids), self.worker_id))
+
+    def requeue_expired(self):
+        # Jobs of a worker that died mid-lease go back to pending, or to failed if out of attempts
+        expired_before = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        with transaction("requeue_keyword_jobs") as cur:
+            cur.execute("""
+                UPDATE keyword_jobs
+                SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                    claimed_by = NULL, error = 'lease expired'
+                WHERE status = 'running' AND claimed_at < %s
+            """, (self.max_attempts, expired_before))
+            return cur.rowcount
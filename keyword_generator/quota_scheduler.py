@@ -0,0 +1,43 @@
+import heapq
+import itertools
+import threading
+
+
+class FairQuotaScheduler:
+    """
+    Hands out fetch jobs so the shared RapidAPI quota is split evenly
+    across locales: the next job always comes from the locale that has
+    spent the fewest requests so far, and within a locale from the
+    highest-priority seed. Retries are charged as well, so a locale that
+    keeps failing cannot crowd the others out.
+    """
+
+    def __init__(self):
+        self.queues = {}
+        self.spent = {}
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+
+    def add(self, locale, job, priority=0.0):
+        with self.lock:
+            self.spent.setdefault(locale, 0)
+            # Ties keep insertion order, so equal-priority seeds go in seed order
+            heapq.heappush(self.queues.setdefault(locale, []), (-priority, next(self.sequence), job))
+
+    def next(self):
+        # Returns (locale, job) and charges the first request to that locale
+        with self.lock:
+            waiting = [locale for locale, queue in self.queues.items() if queue]
+            if not waiting:
+                return None
+            locale = min(waiting, key=lambda locale: self.spent[locale])
+            self.spent[locale] += 1
+            return locale, heapq.heappop(self.queues[locale])[2]
+
+    def charge(self, locale, requests=1):
+        with self.lock:
+            self.spent[locale] = self.spent.get(locale, 0) + requests
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(queue) for queue in self.queues.values())
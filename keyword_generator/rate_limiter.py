@@ -0,0 +1,45 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every fetch worker so the combined
+    request rate never exceeds the RapidAPI plan quota.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(
+                    self.paused_until - now,
+                    (1 - self.tokens) / self.rate,
+                )
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # A 429 means the quota window is exhausted for everyone, not just
+        # the worker that saw it, so hold back all callers.
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = 0
+            self.paused_until = max(self.paused_until, now + seconds)
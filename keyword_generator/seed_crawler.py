@@ -0,0 +1,124 @@
+import heapq
+import itertools
+
+import numpy as np
+
+from embedding_cache import normalize_rows, normalize_text
+
+
+class SeedExpansionCrawler:
+    """
+    Best-first crawl outward from the configured seeds. The strongest
+    results of each round become frontier seeds, ranked by their score
+    plus how far they sit semantically from every seed explored so far,
+    so quota goes to promising phrases in new territory instead of to
+    rewordings of seeds already covered. Phrases already explored or
+    excluded (blacklisted, exactly or as near-duplicates) never enter the
+    frontier, and the crawl stops once the next expansion would overrun
+    the request budget.
+
+    Novelty only shrinks as more seeds are explored, so stale priorities
+    are re-scored lazily when they reach the top of the heap.
+    """
+
+    def __init__(self, embed_fn, excluded_fn, budget, novelty_weight=0.5, batch_size=4, frontier_per_round=20):
+        self.embed_fn = embed_fn
+        self.excluded_fn = excluded_fn
+        self.budget = budget
+        self.novelty_weight = novelty_weight
+        self.batch_size = batch_size
+        self.frontier_per_round = frontier_per_round
+        self.explored = set()
+        self.explored_vectors = None
+        self.queued = set()
+        self.frontier = []
+        self.sequence = itertools.count()
+        self.spent = 0
+
+    def mark_explored(self, texts):
+        new_texts = [text for text in dict.fromkeys(map(normalize_text, texts)) if text not in self.explored]
+        if not new_texts:
+            return
+        vectors = normalize_rows(np.asarray(self.embed_fn(new_texts), dtype=np.float32))
+        self.explored_vectors = vectors if self.explored_vectors is None else np.vstack([self.explored_vectors, vectors])
+        self.explored.update(new_texts)
+
+    def novelty(self, texts):
+        if self.explored_vectors is None:
+            return np.ones(len(texts), dtype=np.float32)
+        vectors = normalize_rows(np.asarray(self.embed_fn(list(texts)), dtype=np.float32))
+        return 1.0 - (vectors @ self.explored_vectors.T).max(axis=1)
+
+    def _stamp(self):
+        return 0 if self.explored_vectors is None else len(self.explored_vectors)
+
+    def offer(self, scored):
+        """
+        scored holds (text, score, payload) for one round's surviving
+        results; the best frontier_per_round new phrases join the frontier.
+        payload comes back unchanged with the phrase from next_batch.
+        """
+        candidates = {}
+        for text, score, payload in sorted(scored, key=lambda item: -item[1]):
+            norm = normalize_text(text)
+            if norm in self.explored or norm in self.queued or norm in candidates:
+                continue
+            candidates[norm] = (score, payload)
+            if len(candidates) >= self.frontier_per_round:
+                break
+        if not candidates:
+            return 0
+
+        texts = list(candidates)
+        keep = ~np.asarray(self.excluded_fn(texts), dtype=bool)
+        texts = [text for text, kept in zip(texts, keep) if kept]
+        stamp = self._stamp()
+        for text, novelty in zip(texts, self.novelty(texts)):
+            score, payload = candidates[text]
+            self._push(text, score, payload, float(novelty), stamp)
+            self.queued.add(text)
+        return len(texts)
+
+    def _push(self, text, score, payload, novelty, stamp):
+        priority = score + self.novelty_weight * novelty
+        heapq.heappush(self.frontier, (-priority, next(self.sequence), text, score, payload, stamp))
+
+    def next_batch(self, cost_fn):
+        """
+        Pop up to batch_size phrases that fit in the remaining budget.
+        Each popped phrase counts as explored at once, so phrases later in
+        the same batch are judged against it too.
+        """
+        batch, planned = [], 0
+        while self.frontier and len(batch) < self.batch_size:
+            entry = heapq.heappop(self.frontier)
+            _, _, text, score, payload, stamp = entry
+            if stamp != self._stamp():
+                self._push(text, score, payload, float(self.novelty([text])[0]), self._stamp())
+                continue
+            cost = cost_fn(text)
+            if self.spent + planned + cost > self.budget:
+                heapq.heappush(self.frontier, entry)
+                break
+            planned += cost
+            self.queued.discard(text)
+            self.mark_explored([text])
+            batch.append((text, payload))
+        return batch
+
+    def crawl(self, fetch_fn, score_fn, cost_fn):
+        """
+        fetch_fn takes a batch of (text, payload) and returns the rows
+        fetched plus the requests it actually spent; score_fn turns rows
+        into (text, score, payload) for offer.
+        """
+        rounds = 0
+        while True:
+            batch = self.next_batch(cost_fn)
+            if not batch:
+                break
+            rows, spent = fetch_fn(batch)
+            self.spent += spent
+            self.offer(score_fn(rows))
+            rounds += 1
+        return rounds
@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from embedding_backend import (
+    OnnxSentenceTransformerBackend,
+    QuantizedSentenceTransformerBackend,
+    SentenceTransformerBackend,
+    neighbour_agreement,
+)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+WORDS = ["gaming", "chairs", "desk", "lamps", "robot", "vacuums", "air", "fryers", "best", "cheap"]
+KEYWORDS = [
+    "gaming chairs", "best gaming chair", "ergonomic office chair", "cheap gaming chairs uk",
+    "standing desks", "electric standing desk", "desk lamps", "led desk lamp",
+    "robot vacuums", "robot vacuum for pet hair", "cordless vacuum cleaner", "best robot hoover",
+    "air fryers", "air fryer recipes", "dual basket air fryer", "slow cooker recipes",
+    "running shoes", "trail running shoes", "marathon training plan", "gym trainers",
+]
+
+
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    # A two-layer BERT with random weights: enough to exercise loading, not ranking
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    directory = tmp_path_factory.mktemp("tiny-bert")
+    vocab_path = directory / "vocab.txt"
+    vocab_path.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS))
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=5 + len(WORDS), hidden_size=32, num_hidden_layers=2,
+                        num_attention_heads=2, intermediate_size=64)
+    BertModel(config).save_pretrained(directory)
+    BertTokenizerFast(str(vocab_path)).save_pretrained(directory)
+
+    path = str(tmp_path_factory.mktemp("tiny-sentence-model"))
+    transformer = models.Transformer(str(directory))
+    SentenceTransformer(modules=[transformer, models.Pooling(32)]).save(path)
+    return path
+
+
+def real_model_or_skip():
+    from sentence_transformers import SentenceTransformer
+
+    try:
+        SentenceTransformer(MODEL_NAME, device="cpu", local_files_only=True)
+    except Exception as error:
+        pytest.skip(f"{MODEL_NAME} is not in the local model cache ({error.__class__.__name__})")
+
+
+def test_quantized_model_is_saved_once_and_then_loaded_directly(tiny_model, tmp_path, monkeypatch):
+    first = QuantizedSentenceTransformerBackend(tiny_model, cache_dir=str(tmp_path))
+    expected = first.encode(["gaming chairs", "desk lamps"])
+    assert os.path.exists(first.saved_model_path())
+
+    def quantize_dynamic(*args, **kwargs):
+        raise AssertionError("the saved model should be loaded without quantizing again")
+
+    monkeypatch.setattr(torch.quantization, "quantize_dynamic", quantize_dynamic)
+    second = QuantizedSentenceTransformerBackend(tiny_model, cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(second.encode(["gaming chairs", "desk lamps"]), expected)
+
+
+def test_onnx_backend_loads_the_pre_quantized_file(tiny_model, tmp_path):
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    exported = str(tmp_path / "onnx-model")
+    model = SentenceTransformer(tiny_model, device="cpu", backend="onnx")
+    model.save(exported)
+    export_dynamic_quantized_onnx_model(model, "avx2", exported)
+
+    backend = OnnxSentenceTransformerBackend(exported, num_threads=1, processes=4)
+    embeddings = backend.encode(["gaming chairs", "desk lamps", "air fryers"])
+
+    assert backend.cache_name.endswith("-model_quint8_avx2")
+    assert backend.processes == 0
+    assert embeddings.shape == (3, 32)
+    assert backend.model[0].auto_model.model.get_session_options().intra_op_num_threads == 1
+
+
+def test_neighbour_agreement():
+    vectors = np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0], [0.1, 0.9]])
+    assert neighbour_agreement(vectors, vectors * 3, k=1) == 1.0
+    assert neighbour_agreement(vectors, vectors[[0, 2, 1, 3]], k=1) == 0.0
+
+
+@pytest.mark.parametrize("backend_class", [QuantizedSentenceTransformerBackend, OnnxSentenceTransformerBackend])
+def test_quantized_backends_rank_like_fp32(backend_class, tmp_path):
+    real_model_or_skip()
+    reference = SentenceTransformerBackend(MODEL_NAME).encode(KEYWORDS)
+    quantized = backend_class(MODEL_NAME, cache_dir=str(tmp_path)).encode(KEYWORDS)
+
+    assert neighbour_agreement(reference, quantized, k=1) == 1.0
+    assert neighbour_agreement(reference, quantized, k=3) >= 0.9
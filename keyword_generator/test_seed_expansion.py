@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+
+import fetch_keywords
+from embedding_backend import HashingBackend
+from rate_limiter import TokenBucket
+from quota_scheduler import FairQuotaScheduler
+
+LOCALES = [("GB", "en"), ("US", "en")]
+
+
+class NoNearDuplicates:
+    def matches(self, texts):
+        return np.zeros(len(texts), dtype=bool)
+
+
+def stub_rapidapi(monkeypatch):
+    # Every request returns fresh phrases, so only the budget can end the crawl
+    calls = []
+    lock = threading.Lock()
+
+    def fetch_keywords_from_api(endpoint, params):
+        with lock:
+            calls.append((endpoint, params["keyword"]))
+        return [
+            {"text": f"{params['keyword']} {endpoint} idea {i}", "volume": 500,
+             "competition_level": "low", "trend": 1.0}
+            for i in range(3)
+        ]
+
+    backend = HashingBackend("stub")
+    monkeypatch.setattr(fetch_keywords, "fetch_keywords_from_api", fetch_keywords_from_api)
+    monkeypatch.setattr(fetch_keywords, "fetch_cached_keywords", lambda *args, **kwargs: {})
+    monkeypatch.setattr(fetch_keywords, "save_raw_keywords", lambda rows: None)
+    monkeypatch.setattr(fetch_keywords, "embed_texts", backend.encode)
+    return calls
+
+
+def seed_rows(seed):
+    return [
+        {"text": f"{seed} tips {i}", "volume": 500, "competition_level": "low", "trend": 1.0,
+         "seed_keyword": seed, "category": "gaming", "location": "GB", "lang": "en"}
+        for i in range(5)
+    ]
+
+
+def test_empty_scheduler_passed_in_is_the_one_charged(monkeypatch):
+    stub_rapidapi(monkeypatch)
+    scheduler = FairQuotaScheduler()
+    fetch_keywords.fetch_all_seeds_concurrently(
+        {("gaming chairs", locale): "gaming" for locale in LOCALES},
+        limiter=TokenBucket(1000, capacity=1000),
+        scheduler=scheduler,
+    )
+    # globalkey is shared by both en locales, so 5 requests in total
+    assert sum(scheduler.spent.values()) == 5
+
+
+def test_expansion_stops_at_the_request_budget(monkeypatch):
+    calls = stub_rapidapi(monkeypatch)
+    seeds = ["gaming chairs", "desk lamps"]
+    budget = 12
+
+    expansion_rows = fetch_keywords.expand_seeds(
+        seeds, {seed: seed_rows(seed) for seed in seeds}, LOCALES, set(), NoNearDuplicates(),
+        keep=None, budget=budget, limiter=TokenBucket(1000, capacity=1000),
+    )
+
+    # Each phrase costs 5 requests over the two locales, so two fit in 12
+    assert 0 < len(calls) <= budget
+    assert len(calls) == 10
+    # Shared globalkey results are fanned out to both locales: 2 phrases x 6 request slots x 3 rows
+    assert sum(len(rows) for rows in expansion_rows.values()) == 2 * 6 * 3
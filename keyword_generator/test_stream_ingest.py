@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from stream_ingest import compact_rows, ingest_dump, iter_json_array
+
+ROWS = [
+    {"text": "gaming chairs, ranked]", "volume": 500, "competition_level": "low", "trend": 1.5},
+    {"text": "desk \"lamps\" [uk]", "volume": 120, "competition_level": "medium", "trend": 12.5e3,
+     "bids": {"low": [0.1, 0.2], "high": {"top": -3e-2}}},
+    {"text": "robot vacuums", "volume": None, "competition_level": None, "trend": -0.0},
+]
+
+
+def chunked(text, size):
+    return (text[start:start + size] for start in range(0, len(text), size))
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 4096])
+def test_elements_survive_any_chunk_boundary(size):
+    values = ROWS + [12.5e3, -1, True, None, "a ] , string", [], {}, [[1, [2]], {"x": "]"}]]
+    document = json.dumps(values, indent=1)
+    assert list(iter_json_array(chunked(document, size))) == values
+
+
+def test_single_object_error_body_is_one_element():
+    body = json.dumps({"message": "You have exceeded the rate limit", "code": 429})
+    assert list(iter_json_array(chunked(body, 5))) == [json.loads(body)]
+
+
+@pytest.mark.parametrize("document", ["[1, 2", '[{"text": "a"', "", "[1 2]", "[1,, 2]", "[, 1]", "[1, ]"])
+def test_truncated_or_malformed_input_raises(document):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(document, 3)))
+
+
+def test_compact_rows_keeps_used_fields_and_drops_unusable_items():
+    items = ROWS + [{"message": "quota"}, {"text": None}, {"text": "   "}, "text", 42, None]
+    assert list(compact_rows(items)) == [
+        {"text": "gaming chairs, ranked]", "volume": 500, "competition_level": "low", "trend": 1.5},
+        {"text": "desk \"lamps\" [uk]", "volume": 120, "competition_level": "medium", "trend": 12.5e3},
+        {"text": "robot vacuums", "volume": None, "competition_level": None, "trend": -0.0},
+    ]
+
+
+def test_ingest_dump_applies_the_row_wise_filters(tmp_path):
+    path = tmp_path / "dump.json"
+    path.write_text(json.dumps(ROWS + [
+        {"text": "blocked phrase", "volume": 900, "competition_level": "low", "trend": 2.0},
+        {"text": "oneword", "volume": 900, "competition_level": "low", "trend": 2.0},
+    ]))
+    survivors = ingest_dump(str(path), "offline dump", "gaming", {"blocked phrase"})
+    assert [row["text"] for row in survivors] == ["gaming chairs, ranked]", "desk \"lamps\" [uk]"]
+    assert {row["seed_keyword"] for row in survivors} == {"offline dump"}
@@ -0,0 +1,68 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import trends_enrichment
+from trends_enrichment import StubTrendsClient, TrendsCache, enrich_with_trends, momentum_features
+
+
+def scored_table():
+    return pd.DataFrame({
+        "text": ["standing desks", "air fryers", "robot vacuums"],
+        "trend": [5.0, 5.0, 5.0],
+        "score": [3.0, 2.0, 1.0],
+    })
+
+
+def test_second_enrichment_within_ttl_stays_offline(tmp_path):
+    client = StubTrendsClient()
+    cache = TrendsCache(str(tmp_path), ttl_seconds=3600)
+
+    first = enrich_with_trends(scored_table(), client, cache, requests_per_second=1000)
+    calls = client.calls
+    assert calls == 1
+    second = enrich_with_trends(scored_table(), client, cache, requests_per_second=1000)
+
+    assert client.calls == calls
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_expired_entries_are_refetched(tmp_path, monkeypatch):
+    client = StubTrendsClient()
+    cache = TrendsCache(str(tmp_path), ttl_seconds=3600)
+    enrich_with_trends(scored_table(), client, cache, requests_per_second=1000)
+
+    now = time.time()
+    monkeypatch.setattr(trends_enrichment.time, "time", lambda: now + 7200)
+    enrich_with_trends(scored_table(), client, cache, requests_per_second=1000)
+
+    assert client.calls == 2
+
+
+def test_momentum_features_on_a_known_series():
+    doubled = [10, 10, 10, 10, 20, 20, 20, 20]
+    features = momentum_features([doubled, [50, 50, 50, 50, 50, 50, 50, 50], [30, 40], []])
+
+    assert features["momentum"] == pytest.approx([1.0, 0.0, 0.0, 0.0])
+    assert features["level"] == pytest.approx([0.2, 0.5, 0.0, 0.0])
+    # Least-squares slope of 0.1, 0.1, 0.1, 0.1, 0.2, 0.2, 0.2, 0.2 over weeks 0-7
+    assert features["slope"] == pytest.approx([0.8 / 42, 0.0, 0.0, 0.0])
+
+
+def test_momentum_is_weighted_like_the_percent_trend(tmp_path):
+    class FixedClient:
+        calls = 0
+
+        def interest_over_time(self, keywords):
+            rising = [10, 10, 10, 10, 15, 15, 15, 15]
+            return {keyword: rising if keyword == "robot vacuums" else [] for keyword in keywords}
+
+    enriched = enrich_with_trends(scored_table(), FixedClient(), TrendsCache(str(tmp_path), 3600),
+                                  weight=0.2, requests_per_second=1000)
+
+    # +50% interest adds 0.2 * 50 points, enough to move the last row to the top
+    assert enriched["text"].tolist()[0] == "robot vacuums"
+    assert enriched["score"].iloc[0] == pytest.approx(1.0 + 0.2 * 50)
+    assert np.array_equal(enriched["score"].iloc[1:], [3.0, 2.0])
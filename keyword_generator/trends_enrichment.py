@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from embedding_cache import normalize_text
+from rate_limiter import TokenBucket
+from run_metrics import increment, span
+
+# Google Trends compares at most five terms per request
+TRENDS_BATCH_SIZE = 5
+# Weeks in each window of the momentum ratio
+MOMENTUM_WINDOW = 4
+
+
+class TrendspyClient:
+    """
+    Interest-over-time lookups through trendspy, imported on first use so
+    runs without enrichment never need it.
+    """
+
+    def __init__(self, timeframe="today 3-m", geo=""):
+        self.timeframe = timeframe
+        self.geo = geo
+        self._trends = None
+
+    def interest_over_time(self, keywords):
+        if self._trends is None:
+            from trendspy import Trends
+
+            self._trends = Trends()
+        frame = self._trends.interest_over_time(keywords, timeframe=self.timeframe, geo=self.geo)
+        if frame is None or frame.empty:
+            return {keyword: [] for keyword in keywords}
+        return {
+            keyword: [float(value) for value in frame[keyword].tolist()] if keyword in frame.columns else []
+            for keyword in keywords
+        }
+
+
+class StubTrendsClient:
+    """
+    Deterministic weekly series derived from each keyword's text, for dry
+    runs, the benchmark and tests. Counts its calls so callers can check
+    that cached reruns stay offline.
+    """
+
+    def __init__(self, weeks=13):
+        self.weeks = weeks
+        self.calls = 0
+
+    def interest_over_time(self, keywords):
+        self.calls += 1
+        series = {}
+        for keyword in keywords:
+            rng = np.random.default_rng(zlib.crc32(keyword.encode()))
+            slope = rng.uniform(-3, 3)
+            values = 50 + slope * np.arange(self.weeks) + rng.normal(0, 5, self.weeks)
+            series[keyword] = np.clip(values, 0, 100).round().tolist()
+        return series
+
+
+class TrendsCache:
+    """
+    Local store of interest-over-time series, one JSON file per keyword,
+    trusted for ttl_seconds. Keywords without Trends data are cached as
+    empty series so reruns don't ask again.
+    """
+
+    def __init__(self, directory, ttl_seconds):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, keyword):
+        return os.path.join(self.directory, hashlib.sha1(keyword.encode()).hexdigest() + ".json")
+
+    def get(self, keyword):
+        try:
+            with open(self._path(keyword)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["fetched_at"] > self.ttl_seconds:
+            return None
+        return entry["values"]
+
+    def put(self, keyword, values):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(keyword)
+        # Written to a temp file first so a crash never leaves half an entry
+        with open(path + ".tmp", "w") as f:
+            json.dump({"keyword": keyword, "fetched_at": time.time(), "values": list(values)}, f)
+        os.replace(path + ".tmp", path)
+
+
+def fetch_series(keywords, client, cache, requests_per_second=0.2, max_workers=2):
+    """
+    Series for every keyword, from the cache where fresh and otherwise in
+    concurrent batches of five behind a shared token bucket. A failed
+    batch is left uncached and its keywords get empty series this run.
+    """
+    keys = list(dict.fromkeys(normalize_text(keyword) for keyword in keywords))
+    series, missing = {}, []
+    for key in keys:
+        cached = cache.get(key)
+        if cached is None:
+            missing.append(key)
+        else:
+            series[key] = cached
+    increment("trends_cache_hits_total", len(keys) - len(missing))
+    if not missing:
+        return series
+
+    limiter = TokenBucket(requests_per_second)
+
+    def fetch_batch(batch):
+        limiter.acquire()
+        with span("trends_request"):
+            return client.interest_over_time(batch)
+
+    batches = [missing[start:start + TRENDS_BATCH_SIZE] for start in range(0, len(missing), TRENDS_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_batch, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            increment("trends_requests_total")
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"⚠️ Trends lookup failed for {batch}: {e}")
+                increment("trends_failed_requests_total")
+                continue
+            for key in batch:
+                values = result.get(key, [])
+                cache.put(key, values)
+                series[key] = values
+    print(f"Trends: {len(keys) - len(missing)} series from cache, {len(missing)} fetched in {len(batches)} requests.")
+    return series
+
+
+def momentum_features(series_list, window=MOMENTUM_WINDOW):
+    """
+    Turn series of any length into aligned feature columns in one pass:
+    right-aligned into a NaN-padded matrix, then
+      momentum: mean of the last window points over the window before, minus 1
+      slope:    least-squares slope of the last 2 * window points, per week on a 0-1 scale
+      level:    mean of the last window points on a 0-1 scale
+    Keywords without enough data get zeros.
+    """
+    length = max([len(values) for values in series_list] + [2 * window])
+    matrix = np.full((len(series_list), length), np.nan)
+    for row, values in enumerate(series_list):
+        if len(values):
+            matrix[row, length - len(values):] = values
+    matrix = matrix[:, -2 * window:] / 100.0
+
+    recent, previous = matrix[:, window:], matrix[:, :window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        recent_mean = np.nansum(recent, axis=1) / (~np.isnan(recent)).sum(axis=1)
+        previous_mean = np.nansum(previous, axis=1) / (~np.isnan(previous)).sum(axis=1)
+        momentum = np.where(previous_mean > 0, recent_mean / previous_mean - 1, 0.0)
+
+        x = np.arange(2 * window, dtype=np.float64)
+        valid = ~np.isnan(matrix)
+        counts = valid.sum(axis=1)
+        x_mean = (valid * x).sum(axis=1) / counts
+        y_mean = np.nansum(matrix, axis=1) / counts
+        dx = np.where(valid, x - x_mean[:, None], 0.0)
+        dy = np.where(valid, matrix - y_mean[:, None], 0.0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+
+    enough = counts >= window + 1
+    return {
+        "momentum": np.where(enough, np.nan_to_num(momentum), 0.0),
+        "slope": np.where(enough, np.nan_to_num(slope), 0.0),
+        "level": np.where(enough, np.nan_to_num(recent_mean), 0.0),
+    }
+
+
+def enrich_with_trends(scored, client, cache, shortlist=50, weight=0.2, requests_per_second=0.2, max_workers=2):
+    """
+    Look up the top `shortlist` rows of a score_candidates table, add their
+    momentum features as columns and fold momentum into their score. Rows
+    outside the shortlist are left as scored and the table is re-sorted by
+    score.
+
+    Momentum is clipped to +/-1 and added as a percent change, the unit of
+    the API's trend column, so weight compares directly with the 0.4 that
+    score_candidates gives trend: +50% interest adds 50 * weight.
+    """
+    if scored.empty or shortlist <= 0:
+        return scored
+    top = scored.head(shortlist)
+    series = fetch_series(top["text"].tolist(), client, cache, requests_per_second, max_workers)
+    features = momentum_features([series.get(normalize_text(text), []) for text in top["text"]])
+
+    table = scored.copy()
+    for name, values in features.items():
+        column = np.zeros(len(table))
+        column[:len(top)] = values
+        table[f"trends_{name}"] = column
+    table["score"] = table["score"] + weight * 100 * np.clip(table["trends_momentum"].to_numpy(), -1, 1)
+
+    order = np.argsort(-table["score"].to_numpy(), kind="stable")
+    return table.iloc[order].reset_index(drop=True)
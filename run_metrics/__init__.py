@@ -0,0 +1,14 @@
+# __init__.py
+
+__all__ = [
+    "Metrics",
+    "metrics",
+    "span",
+    "increment",
+    "observe",
+    "set_gauge",
+    "record_token_usage",
+    "write_run_report",
+]
+from .registry import Metrics, metrics, span, increment, observe, set_gauge, record_token_usage
+from .report import write_run_report
@@ -0,0 +1,81 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; wide enough for a DB round trip and a multi-minute completion
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _series_key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Metrics:
+    """
+    In-process counters, gauges and histograms for one run.
+
+    Histograms keep every observation (a run makes at most a few thousand),
+    so the JSON report can give exact percentiles; the Prometheus output
+    buckets them at write time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def increment(self, name, value=1, **labels):
+        key = _series_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[_series_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _series_key(name, labels)
+        with self.lock:
+            self.histograms.setdefault(key, []).append(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        # Times the block into <name>_duration_seconds, labelled with its outcome
+        start_time = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.observe(f"{name}_duration_seconds", time.perf_counter() - start_time, outcome=outcome, **labels)
+
+    def record_token_usage(self, usage, **labels):
+        # usage is the "usage" object of an OpenAI response
+        for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            if usage and usage.get(kind):
+                self.increment("openai_tokens_total", usage[kind], kind=kind.replace("_tokens", ""), **labels)
+
+    def reset(self):
+        # A long-lived process reports per job, starting each from an empty registry
+        with self.lock:
+            self.started_at = time.time()
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counters), dict(self.gauges), {key: list(values) for key, values in self.histograms.items()}
+
+
+# Shared by everything in the process
+metrics = Metrics()
+span = metrics.span
+increment = metrics.increment
+observe = metrics.observe
+set_gauge = metrics.set_gauge
+record_token_usage = metrics.record_token_usage
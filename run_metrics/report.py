@@ -0,0 +1,123 @@
+import json
+import os
+import time
+
+from .registry import LATENCY_BUCKETS, metrics
+
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+PROMETHEUS_PREFIX = "quantumquestor_"
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _summarize(values):
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "sum": round(sum(ordered), 6),
+        "min": round(ordered[0], 6),
+        "p50": round(_percentile(ordered, 0.5), 6),
+        "p95": round(_percentile(ordered, 0.95), 6),
+        "p99": round(_percentile(ordered, 0.99), 6),
+        "max": round(ordered[-1], 6),
+    }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def build_json_report(pipeline, registry=metrics, extra=None):
+    counters, gauges, histograms = registry.snapshot()
+    finished_at = time.time()
+    report = {
+        "pipeline": pipeline,
+        "started_at": registry.started_at,
+        "finished_at": finished_at,
+        "duration_seconds": round(finished_at - registry.started_at, 3),
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(counters.items())
+        ],
+        "gauges": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(gauges.items())
+        ],
+        "histograms": [
+            dict({"name": name, "labels": dict(labels)}, **_summarize(values))
+            for (name, labels), values in sorted(histograms.items())
+        ],
+    }
+    if extra:
+        report.update(extra)
+    return report
+
+
+def build_prometheus_text(pipeline, registry=metrics):
+    # Text exposition format for node_exporter's textfile collector
+    counters, gauges, histograms = registry.snapshot()
+    base = (("pipeline", pipeline),)
+    lines = []
+    typed = set()
+
+    def declare(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        metric = PROMETHEUS_PREFIX + name
+        declare(metric, "counter")
+        lines.append(f"{metric}{_labels(base + labels)} {value}")
+
+    for (name, labels), value in sorted(gauges.items()):
+        metric = PROMETHEUS_PREFIX + name
+        declare(metric, "gauge")
+        lines.append(f"{metric}{_labels(base + labels)} {value}")
+
+    for (name, labels), values in sorted(histograms.items()):
+        metric = PROMETHEUS_PREFIX + name
+        declare(metric, "histogram")
+        for bound in LATENCY_BUCKETS:
+            count = sum(1 for value in values if value <= bound)
+            lines.append(f"{metric}_bucket{_labels(base + labels + (('le', bound),))} {count}")
+        lines.append(f"{metric}_bucket{_labels(base + labels + (('le', '+Inf'),))} {len(values)}")
+        lines.append(f"{metric}_sum{_labels(base + labels)} {sum(values)}")
+        lines.append(f"{metric}_count{_labels(base + labels)} {len(values)}")
+
+    metric = PROMETHEUS_PREFIX + "run_finished_timestamp_seconds"
+    declare(metric, "gauge")
+    lines.append(f"{metric}{_labels(base)} {time.time()}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    # The textfile collector must never read a half-written file
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def write_run_report(pipeline, extra=None, directory=None, registry=metrics):
+    """
+    Write <pipeline>_report.json and <pipeline>.prom to METRICS_DIR.
+    Returns the two paths.
+    """
+    directory = directory or METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    json_path = os.path.join(directory, f"{pipeline}_report.json")
+    prom_path = os.path.join(directory, f"{pipeline}.prom")
+    _write_atomic(json_path, json.dumps(build_json_report(pipeline, registry, extra), indent=2))
+    _write_atomic(prom_path, build_prometheus_text(pipeline, registry))
+    print(f"📈 Run metrics written to {json_path} and {prom_path}")
+    return json_path, prom_path